@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+import tempfile
 
 # CAPITOL WORDS CONFIGS
 
@@ -100,6 +101,36 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# The parser invalidates cached term counts when it indexes new dates, which
+# only reaches the web servers if they share a cache backend (e.g. memcached),
+# otherwise stale entries live until they time out.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'DJANGO_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', 'capitolweb'),
+        'TIMEOUT': 60 * 60 * 6,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+}
+
+
+# Parsed legislators yaml files are snapshotted here so they're only parsed
+# once per version of the file. Set to an empty string to disable.
+
+LEGISLATORS_SNAPSHOT_DIR = os.getenv(
+    'LEGISLATORS_SNAPSHOT_DIR',
+    os.path.join(tempfile.gettempdir(), 'capitolweb-legislators'),
+)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -1,3 +1,9 @@
 from capitolweb.settings import *
 
 ES_CW_INDEX = 'test-index'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
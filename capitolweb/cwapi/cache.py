@@ -0,0 +1,50 @@
+import uuid
+import hashlib
+
+from django.core.cache import cache
+
+
+TERM_COUNTS_GENERATION_KEY = 'cwapi:term_counts:generation'
+
+
+def get_term_counts_generation():
+    """Returns the current generation of cached term counts. Every cache key
+    for data derived from the CREC index includes this value so that bumping
+    it (see :func:`invalidate_term_counts_cache`) orphans all existing entries,
+    which are then evicted as usual.
+
+    Returns:
+        str: An opaque generation identifier.
+    """
+    generation = cache.get(TERM_COUNTS_GENERATION_KEY)
+    if generation is None:
+        # If the generation was evicted, start a new one rather than reusing
+        # an old value that may still have live entries under it.
+        cache.add(TERM_COUNTS_GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(TERM_COUNTS_GENERATION_KEY)
+    return generation
+
+
+def invalidate_term_counts_cache():
+    """Invalidates all cached term counts and search results. Should be called
+    whenever new CREC documents are indexed.
+    """
+    cache.set(TERM_COUNTS_GENERATION_KEY, uuid.uuid4().hex, None)
+
+
+def make_cache_key(prefix, generation, *parts):
+    """Builds a cache key that is safe to use with any cache backend
+    regardless of the contents of ``parts``.
+
+    Args:
+        prefix (str): Namespace for the key.
+        generation (str): Current cache generation.
+        *parts: Values identifying the cached item.
+
+    Returns:
+        str: The cache key.
+    """
+    digest = hashlib.md5(
+        '\x00'.join(str(p) for p in parts).encode('utf-8')
+    ).hexdigest()
+    return '{0}:{1}:{2}'.format(prefix, generation, digest)
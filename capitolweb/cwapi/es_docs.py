@@ -1,12 +1,36 @@
+import time
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
 from django.conf import settings
+from elasticsearch.helpers import streaming_bulk
 from elasticsearch_dsl import Search, Index, DocType, Date, Text, Nested
+from elasticsearch_dsl import Keyword, Integer
 from elasticsearch_dsl import InnerObjectWrapper
 from elasticsearch_dsl.connections import connections
 
+from cwapi.models import MAX_TERM_LENGTH
+
+
+logger = logging.getLogger(__name__)
+
 
 connections.create_connection(hosts=[settings.ES_URL], timeout=20)
 
 
+DEFAULT_BULK_CHUNK_SIZE = 500
+
+
+DEFAULT_BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+
+
+DEFAULT_BULK_MAX_RETRIES = 5
+
+
+DEFAULT_BULK_INITIAL_BACKOFF = 2
+
+
 def make_search():
     """Convenience function for returning a base :cls:`elasticsearch_dsl.Search`
     instance using the index name in django settings.
@@ -23,63 +47,30 @@ def get_term_count_agg(results):
     
     Returns:
         list: A list of aggregation buckets containing both the date and the
-            aggregated term count for that bucket.
+            aggregated term count for that bucket (under
+            ``bucket['term_counts']['value']``).
     """
-    return results.get('aggregations', {}).get('term_counts_by_day', {}).get('buckets')
+    buckets = results.get('aggregations', {}).get('term_counts_by_day', {}).get('buckets')
+    if buckets is None:
+        return None
+    for bucket in buckets:
+        count = bucket.get('term_counts', {}).get('term', {}).get('count', {}).get('value')
+        bucket['term_counts'] = {'value': int(count or 0)}
+    return buckets
 
 
-def term_counts_script(term):
-    """Returns the complete configuration for an elasticsearch scripted metric
-    aggregation script (https://www.elastic.co/guide/en/elasticsearch/reference/5.1/search-aggregations-metrics-scripted-metric-aggregation.html).
-    that will count the occurences of the provided term in every CREC document
-    in the bucket. The script parts are written in painless. Note: because
-    painless limits total iterations in a loop, this will not return accurate
-    counts for docs that contain more than 4999 tokens (the overwhelming
-    majority of CREC documents fall below this limit).
-    
+def count_terms(content):
+    """Counts the occurrences of every lowercased, whitespace delimited token
+    in a CREC document's content.
+
     Args:
-        term (str): A search term to look for in the "content" field of each
-            CREC document.
-    
+        content (str): The content of a CREC document.
+
     Returns:
-        dict: The content for a scripted metric aggregation part of an
-            elasticsearch query.
+        :class:`collections.Counter`: Maps each term to its number of
+            occurrences.
     """
-    return {
-        'params': {
-            '_agg': {},
-            'term': term
-        },
-        'init_script': '''
-            params._agg.counts = [];
-        ''',
-        'map_script': '''
-            def tokens = new StringTokenizer(params._source.content.toLowerCase());
-            int i = 0;
-            int n = 0;
-            while (tokens.hasMoreTokens() && n < 4999) {
-                if (tokens.nextToken().toLowerCase() == params.term) {
-                    i += 1
-                }
-                n += 1;
-            }
-            params._agg.counts.add(i)
-        ''',
-        'combine_script': '''
-            int j = 0;
-            for (i in params._agg.counts) {
-                j += i
-            }
-            return j
-        ''',
-        'reduce_script': '''
-            int j = 0;
-            for (i in params._aggs) {
-                j += i ?: 0
-            }
-            return j;
-        ''',
-    }
+    return Counter(content.lower().split())
 
 
 class CRECDoc(DocType):
@@ -104,15 +95,32 @@ class CRECDoc(DocType):
             'bioguide_id': Text() 
         }
     )
+    term_counts = Nested(
+        properties={
+            'term': Keyword(ignore_above=MAX_TERM_LENGTH),
+            'count': Integer(),
+        }
+    )
     
     class Meta:
         index = settings.ES_CW_INDEX
 
+    def clean(self):
+        """Counts the occurrences of every (lowercased, whitespace delimited)
+        token in the content at index time, so term counts can be aggregated
+        without reading the source of each doc.
+        """
+        if self.content and not self.term_counts:
+            self.term_counts = [
+                {'term': term, 'count': count}
+                for term, count in count_terms(self.content).items()
+            ]
+
 
 def get_term_count_in_doc(es_conn, term, start_date, end_date):
-    """Queries elasticsearch with a scripted metric aggregation, bucketed by
-    day, that counts the total number of occurrences of the provided term in
-    every CREC document in that bucket.
+    """Queries elasticsearch for the total number of occurrences of the
+    provided term in every CREC document, bucketed by day. Sums the per-doc
+    counts stored in the ``term_counts`` field at index time.
     
     Args:
         es_conn :cls:`elasticsearch.Elasticsearch`: A connection to an
@@ -125,6 +133,7 @@ def get_term_count_in_doc(es_conn, term, start_date, end_date):
         dict: The response from the elasticsearch query.
     """
     term = term.lower()
+    term_filter = {'term': {'term_counts.term': term}}
     results = es_conn.search(
         index=CRECDoc._doc_type.index,
         doc_type=CRECDoc._doc_type.name,
@@ -132,15 +141,22 @@ def get_term_count_in_doc(es_conn, term, start_date, end_date):
             'size': 0,
             'query': {
                 'bool': {
-                    'must': {'term': {'content': term}},
-                    'filter': {
-                        'range': {
-                            'date_issued': {
-                                'gte': start_date.strftime('%Y-%m-%dT00:00:00Z'),
-                                'lte': end_date.strftime('%Y-%m-%dT00:00:00Z')
+                    'filter': [
+                        {
+                            'range': {
+                                'date_issued': {
+                                    'gte': start_date.strftime('%Y-%m-%dT00:00:00Z'),
+                                    'lte': end_date.strftime('%Y-%m-%dT00:00:00Z')
+                                }
                             }
-                        }
-                    }
+                        },
+                        {
+                            'nested': {
+                                'path': 'term_counts',
+                                'query': term_filter,
+                            }
+                        },
+                    ]
                 }
             },
             'aggregations': {
@@ -151,7 +167,17 @@ def get_term_count_in_doc(es_conn, term, start_date, end_date):
                     },
                     'aggregations': {
                         'term_counts': {
-                            'scripted_metric': term_counts_script(term)
+                            'nested': {'path': 'term_counts'},
+                            'aggregations': {
+                                'term': {
+                                    'filter': term_filter,
+                                    'aggregations': {
+                                        'count': {
+                                            'sum': {'field': 'term_counts.count'}
+                                        }
+                                    }
+                                }
+                            }
                         }
                     }
                 }
@@ -159,3 +185,95 @@ def get_term_count_in_doc(es_conn, term, start_date, end_date):
         }
     )
     return results
+
+
+def bulk_index_docs(es_conn,
+                    docs,
+                    chunk_size=DEFAULT_BULK_CHUNK_SIZE,
+                    max_chunk_bytes=DEFAULT_BULK_MAX_CHUNK_BYTES,
+                    max_retries=DEFAULT_BULK_MAX_RETRIES,
+                    initial_backoff=DEFAULT_BULK_INITIAL_BACKOFF):
+    """Indexes a batch of :cls:`elasticsearch_dsl.DocType` instances using the
+    bulk API instead of one ``save()`` (and one round trip) per document.
+    Documents rejected with a 429 (the cluster applying backpressure) are
+    retried with exponential backoff, any other failures are returned.
+    
+    Args:
+        es_conn :cls:`elasticsearch.Elasticsearch`: A connection to an
+            elasticsearch cluster.
+        docs (iterable): DocType instances to index.
+        chunk_size (int): Maximum number of docs sent per bulk request.
+        max_chunk_bytes (int): Maximum size in bytes of a bulk request.
+        max_retries (int): Number of times to retry docs rejected with a 429.
+        initial_backoff (int): Seconds to wait before the first retry, doubled
+            for every subsequent retry.
+    
+    Returns:
+        tuple: 2-item tuple containing the number of successfully indexed docs
+            and a list of the bulk API response items for failed docs.
+    """
+    actions = []
+    for doc in docs:
+        doc.full_clean()
+        actions.append(doc.to_dict(include_meta=True))
+    num_indexed = 0
+    errors = []
+    attempt = 0
+    while actions:
+        rejected = []
+        results = streaming_bulk(
+            es_conn,
+            actions,
+            chunk_size=chunk_size,
+            max_chunk_bytes=max_chunk_bytes,
+            raise_on_error=False,
+            raise_on_exception=False,
+        )
+        for action, (ok, item) in zip(actions, results):
+            if ok:
+                num_indexed += 1
+                continue
+            info = next(iter(item.values()))
+            if info.get('status') == 429 and attempt < max_retries:
+                rejected.append(action)
+            else:
+                errors.append(item)
+        if rejected:
+            backoff = initial_backoff * 2 ** attempt
+            logger.warning(
+                '{0} docs rejected by elasticsearch, retrying in {1}s.'.format(
+                    len(rejected), backoff
+                )
+            )
+            time.sleep(backoff)
+        actions = rejected
+        attempt += 1
+    return num_indexed, errors
+
+
+@contextmanager
+def bulk_indexing_settings(es_conn, index):
+    """Context manager that disables refreshes and replicas on an index for
+    the duration of a large backfill, then restores the previous settings and
+    refreshes the index.
+    
+    Args:
+        es_conn :cls:`elasticsearch.Elasticsearch`: A connection to an
+            elasticsearch cluster.
+        index (str): Name of the index being written to.
+    """
+    response = es_conn.indices.get_settings(index=index)
+    index_settings = next(iter(response.values()))['settings']['index']
+    previous = {
+        'refresh_interval': index_settings.get('refresh_interval', '1s'),
+        'number_of_replicas': index_settings['number_of_replicas'],
+    }
+    es_conn.indices.put_settings(
+        index=index,
+        body={'index': {'refresh_interval': '-1', 'number_of_replicas': 0}},
+    )
+    try:
+        yield
+    finally:
+        es_conn.indices.put_settings(index=index, body={'index': previous})
+        es_conn.indices.refresh(index=index)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cwapi', '0002_dailytermcount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='speakerwordcounts',
+            name='bioguide_id',
+            field=models.CharField(max_length=7),
+        ),
+        migrations.AddField(
+            model_name='speakerwordcounts',
+            name='id',
+            field=models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='speakerwordcounts',
+            unique_together=set([('bioguide_id', 'crec_id')]),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 03:50
+from __future__ import unicode_literals
+
+import json
+
+from django.db import migrations, models
+
+
+def backfill_speaker_term_counts(apps, schema_editor):
+    SpeakerWordCounts = apps.get_model('cwapi', 'SpeakerWordCounts')
+    SpeakerTermCount = apps.get_model('cwapi', 'SpeakerTermCount')
+    max_term_length = SpeakerTermCount._meta.get_field('term').max_length
+    rows = []
+    for sw_counts in SpeakerWordCounts.objects.iterator():
+        terms = []
+        for ne_type, counts in json.loads(sw_counts.named_entities).items():
+            terms.extend(
+                (term, 'named_entities_{0}'.format(ne_type), count)
+                for term, count in counts.items()
+            )
+        terms.extend(
+            (term, 'noun_chunks', count)
+            for term, count in json.loads(sw_counts.noun_chunks).items()
+        )
+        for term, term_type, count in terms:
+            if len(term) > max_term_length:
+                continue
+            rows.append(
+                SpeakerTermCount(
+                    bioguide_id=sw_counts.bioguide_id,
+                    crec_id=sw_counts.crec_id,
+                    date=sw_counts.date,
+                    term=term,
+                    type=term_type,
+                    count=count,
+                )
+            )
+        if len(rows) >= 1000:
+            SpeakerTermCount.objects.bulk_create(rows)
+            rows = []
+    SpeakerTermCount.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cwapi', '0003_speakerwordcounts_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpeakerTermCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bioguide_id', models.CharField(max_length=7)),
+                ('crec_id', models.CharField(db_index=True, max_length=64)),
+                ('date', models.DateField()),
+                ('term', models.CharField(max_length=255)),
+                ('type', models.CharField(max_length=64)),
+                ('count', models.IntegerField()),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='speakertermcount',
+            index_together=set([('bioguide_id', 'date')]),
+        ),
+        migrations.RunPython(
+            backfill_speaker_term_counts, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.3 on 2026-10-18 04:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cwapi', '0004_speakertermcount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailytermcount',
+            name='term',
+            field=models.CharField(max_length=256),
+        ),
+    ]
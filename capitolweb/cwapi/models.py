@@ -4,11 +4,66 @@ from __future__ import unicode_literals
 from django.db import models
 
 
+# Longest term kept in the DailyTermCount rollup and in the ``term_counts`` of
+# CRECDocs in elasticsearch, so both give the same counts. Longer terms (e.g.
+# runs of punctuation from a badly formatted doc) are dropped, they're never
+# searched for in practice.
+MAX_TERM_LENGTH = 256
+
+
 class SpeakerWordCounts(models.Model):
     def __str__(self):
         return ",".join([self.crec_id, self.bioguide_id])
-    bioguide_id = models.CharField(max_length=7, primary_key=True)
+    bioguide_id = models.CharField(max_length=7)
     crec_id = models.CharField(max_length=64)
     date = models.DateField()
     named_entities = models.TextField()
     noun_chunks = models.TextField()
+
+    class Meta:
+        unique_together = (('bioguide_id', 'crec_id'),)
+
+
+class SpeakerTermCount(models.Model):
+    """Number of occurrences of a named entity or noun chunk in a CREC
+    document attributed to one of its speakers. ``type`` is ``noun_chunks``
+    for noun chunks and ``named_entities_<TYPE>`` (e.g.
+    ``named_entities_PERSON``) for named entities.
+    """
+    def __str__(self):
+        return "{} - {} ({}): {}".format(
+            self.bioguide_id, self.term, self.type, self.count
+        )
+    bioguide_id = models.CharField(max_length=7)
+    crec_id = models.CharField(max_length=64, db_index=True)
+    date = models.DateField()
+    term = models.CharField(max_length=255)
+    type = models.CharField(max_length=64)
+    count = models.IntegerField()
+
+    class Meta:
+        index_together = (('bioguide_id', 'date'),)
+
+
+class DailyTermCount(models.Model):
+    """Total number of occurrences of a term in all CREC documents issued on
+    a given day, rolled up by the parser.
+    """
+    def __str__(self):
+        return "{} - {}: {}".format(self.date, self.term, self.count)
+    date = models.DateField()
+    term = models.CharField(max_length=MAX_TERM_LENGTH)
+    count = models.IntegerField()
+
+    class Meta:
+        unique_together = (('term', 'date'),)
+
+
+class DailyTermCountCoverage(models.Model):
+    """Marks a day whose term counts have been fully rolled up into
+    DailyTermCount, days without an entry have to be counted in
+    elasticsearch.
+    """
+    def __str__(self):
+        return str(self.date)
+    date = models.DateField(primary_key=True)
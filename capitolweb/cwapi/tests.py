@@ -1,6 +1,7 @@
 import time
 from datetime import datetime
 from contextlib import contextmanager
+from unittest import mock
 
 from django.test import TestCase
 from django.test import override_settings
@@ -12,7 +13,42 @@ from elasticsearch_dsl.connections import connections
 from freezegun import freeze_time
 
 from cwapi.es_docs import CRECDoc, get_term_count_in_doc, get_term_count_agg
+from cwapi.es_docs import bulk_index_docs, bulk_indexing_settings
 from cwapi.views import search_text_match
+from cwapi.views import get_text_search_results
+from cwapi.views import match_speakers_to_bioguide
+from cwapi.views import get_term_counts_histogram
+from cwapi.cache import invalidate_term_counts_cache
+from cwapi.models import DailyTermCount, DailyTermCountCoverage
+from cwapi.models import SpeakerTermCount
+from legislators.models import CongressPerson, State
+from legislators.cache import bump_legislators_version
+
+
+class CRECDocTestCase(TestCase):
+
+    def test_term_counts(self):
+        doc = CRECDoc(
+            title='0',
+            content='foo bar baz Foo\nFOO.',
+            date_issued=datetime(2017, 1, 1)
+        )
+        doc.full_clean()
+        term_counts = {tc['term']: tc['count'] for tc in doc.term_counts}
+        self.assertEquals(
+            {'foo': 2, 'bar': 1, 'baz': 1, 'foo.': 1}, term_counts
+        )
+
+    def test_search_excludes_term_counts(self):
+        with mock.patch.object(
+                Search, 'execute', autospec=True, return_value=[]) as execute:
+            get_text_search_results(
+                datetime(2017, 1, 1), datetime(2017, 1, 30), {'content': 'foo'}
+            )
+        search = execute.call_args[0][0]
+        self.assertEquals(
+            ['term_counts'], search.to_dict()['_source']['excludes']
+        )
 
 
 class CountTermsTestCase(TestCase):
@@ -116,6 +152,247 @@ class CountTermsTestCase(TestCase):
             )
 
 
+def make_term_count_results(counts):
+    return {
+        'aggregations': {
+            'term_counts_by_day': {
+                'buckets': [
+                    {
+                        'key_as_string': '{0}T00:00:00.000Z'.format(day),
+                        'term_counts': {'term': {'count': {'value': count}}},
+                    }
+                    for day, count in counts.items()
+                ]
+            }
+        }
+    }
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'term-counts-test',
+    }
+})
+class TermCountsCacheTestCase(TestCase):
+
+    def setUp(self):
+        invalidate_term_counts_cache()
+        patcher = mock.patch(
+            'cwapi.views.get_term_count_in_doc',
+            side_effect=lambda es_conn, term, start, end: make_term_count_results(
+                {'2017-01-02': 3, '2017-01-05': 1}
+            ),
+        )
+        self.get_term_count_in_doc = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_histogram_is_cached_per_day(self):
+        histogram = get_term_counts_histogram(
+            None, 'foo', datetime(2017, 1, 1), datetime(2017, 1, 3)
+        )
+        self.assertEquals(
+            {'2017-01-01': 0, '2017-01-02': 3, '2017-01-03': 0}, histogram
+        )
+        self.assertEquals(1, self.get_term_count_in_doc.call_count)
+        # Only the days that were not already cached are queried.
+        histogram = get_term_counts_histogram(
+            None, 'foo', datetime(2017, 1, 2), datetime(2017, 1, 5)
+        )
+        self.assertEquals(2, self.get_term_count_in_doc.call_count)
+        _, _, start, end = self.get_term_count_in_doc.call_args[0]
+        self.assertEquals(datetime(2017, 1, 4), start)
+        self.assertEquals(datetime(2017, 1, 5), end)
+        self.assertEquals(
+            {'2017-01-02': 3, '2017-01-03': 0, '2017-01-04': 0, '2017-01-05': 1},
+            histogram
+        )
+        get_term_counts_histogram(
+            None, 'foo', datetime(2017, 1, 1), datetime(2017, 1, 5)
+        )
+        self.assertEquals(2, self.get_term_count_in_doc.call_count)
+        # Different terms are cached separately.
+        get_term_counts_histogram(
+            None, 'bar', datetime(2017, 1, 1), datetime(2017, 1, 5)
+        )
+        self.assertEquals(3, self.get_term_count_in_doc.call_count)
+
+    def test_histogram_reads_rollup(self):
+        for day in range(1, 4):
+            DailyTermCountCoverage.objects.create(date=datetime(2017, 1, day))
+        DailyTermCount.objects.create(date=datetime(2017, 1, 1), term='foo', count=7)
+        DailyTermCount.objects.create(date=datetime(2017, 1, 1), term='bar', count=2)
+        histogram = get_term_counts_histogram(
+            None, 'foo', datetime(2017, 1, 1), datetime(2017, 1, 5)
+        )
+        self.assertEquals(
+            {'2017-01-01': 7, '2017-01-02': 0, '2017-01-03': 0,
+             '2017-01-04': 0, '2017-01-05': 1},
+            histogram
+        )
+        # Only days missing from the rollup are counted in elasticsearch.
+        self.assertEquals(1, self.get_term_count_in_doc.call_count)
+        _, _, start, end = self.get_term_count_in_doc.call_args[0]
+        self.assertEquals(datetime(2017, 1, 4), start)
+        self.assertEquals(datetime(2017, 1, 5), end)
+
+    def test_invalidate(self):
+        get_term_counts_histogram(
+            None, 'foo', datetime(2017, 1, 1), datetime(2017, 1, 3)
+        )
+        invalidate_term_counts_cache()
+        get_term_counts_histogram(
+            None, 'foo', datetime(2017, 1, 1), datetime(2017, 1, 3)
+        )
+        self.assertEquals(2, self.get_term_count_in_doc.call_count)
+
+
+class MatchSpeakersTestCase(TestCase):
+
+    def setUp(self):
+        bump_legislators_version()
+        state = State.objects.get(short='CA')
+        for bioguide_id, name, party in [('A000001', 'Jane Doe', 'Democrat'),
+                                         ('A000002', 'John Roe', 'Republican')]:
+            person = CongressPerson.objects.create(
+                bioguide_id=bioguide_id, official_full=name
+            )
+            person.terms.create(
+                type='rep', state=state, party='Independent',
+                start_date=datetime(2013, 1, 3), end_date=datetime(2015, 1, 3),
+            )
+            person.terms.create(
+                type='rep', state=state, party=party,
+                start_date=datetime(2015, 1, 3), end_date=datetime(2017, 1, 3),
+            )
+
+    def test_match_speakers(self):
+        # The legislators version, then the people and their terms.
+        with self.assertNumQueries(3):
+            matches = match_speakers_to_bioguide(
+                ['Jane Doe', 'John Roe', 'The SPEAKER', 'Jane Doe']
+            )
+        self.assertEquals(3, len(matches))
+        self.assertIsNone(matches['The SPEAKER'])
+        self.assertEquals('Democrat', matches['Jane Doe']['party'])
+        self.assertEquals('Republican', matches['John Roe']['party'])
+        self.assertEquals(
+            'https://www.congress.gov/member/jane-doe/A000001',
+            matches['Jane Doe']['bio_page_url'],
+        )
+        # Previously resolved names are served from the in process cache, even
+        # though the test settings use a dummy cache backend.
+        with self.assertNumQueries(1):
+            self.assertEquals(
+                matches,
+                match_speakers_to_bioguide(['Jane Doe', 'John Roe', 'The SPEAKER'])
+            )
+
+    def test_refreshed_after_new_version(self):
+        match_speakers_to_bioguide(['Jane Doe'])
+        CongressPerson.objects.filter(bioguide_id='A000001').delete()
+        bump_legislators_version()
+        self.assertIsNone(match_speakers_to_bioguide(['Jane Doe'])['Jane Doe'])
+
+
+class SpeakerTermsTestCase(TestCase):
+
+    def setUp(self):
+        rows = [
+            ('A000001', 1, 'health care', 'noun_chunks', 3),
+            ('A000001', 2, 'health care', 'noun_chunks', 2),
+            ('A000001', 2, 'Senate', 'named_entities_ORG', 4),
+            ('A000001', 3, 'Jane Doe', 'named_entities_PERSON', 1),
+            ('A000001', 20, 'tax reform', 'noun_chunks', 10),
+            ('A000002', 1, 'tax reform', 'noun_chunks', 8),
+        ]
+        for bioguide_id, day, term, term_type, count in rows:
+            SpeakerTermCount.objects.create(
+                bioguide_id=bioguide_id,
+                crec_id='crec-{0}'.format(day),
+                date=datetime(2017, 1, day),
+                term=term,
+                type=term_type,
+                count=count,
+            )
+        self.client = Client()
+        self.query_args = {
+            'bioguide_id': 'A000001',
+            'start_date': '2017-01-01',
+            'end_date': '2017-01-10',
+        }
+
+    def test_top_terms(self):
+        response = self.client.get('/cwapi/speaker_terms/', self.query_args)
+        self.assertEquals(200, response.status_code)
+        self.assertEquals(
+            [
+                {'term': 'health care', 'type': 'noun_chunks', 'count': 5},
+                {'term': 'Senate', 'type': 'named_entities_ORG', 'count': 4},
+                {'term': 'Jane Doe', 'type': 'named_entities_PERSON', 'count': 1},
+            ],
+            response.json()['data']
+        )
+
+    def test_type_and_size(self):
+        self.query_args.update({'type': 'named_entities', 'size': 1})
+        response = self.client.get('/cwapi/speaker_terms/', self.query_args)
+        self.assertEquals(
+            [{'term': 'Senate', 'type': 'named_entities_ORG', 'count': 4}],
+            response.json()['data']
+        )
+
+
+class BulkIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.es_conn = connections.get_connection()
+        self.index = Index(settings.ES_CW_INDEX)
+        CRECDoc.init()
+
+    def tearDown(self):
+        self.index.delete()
+
+    def test_bulk_index_docs(self):
+        docs = [
+            CRECDoc(
+                title=str(i),
+                content='foo bar baz Foo',
+                date_issued=datetime(2017, 1, i % 5 + 1)
+            )
+            for i in range(20)
+        ]
+        num_indexed, errors = bulk_index_docs(self.es_conn, docs, chunk_size=7)
+        self.assertEquals(20, num_indexed)
+        self.assertEquals([], errors)
+        self.index.refresh()
+        self.assertEquals(20, CRECDoc.search().count())
+
+    def test_reindex_overwrites_docs(self):
+        for _ in range(2):
+            doc = CRECDoc(
+                meta={'id': 'id-CREC-2017-01-20-pt1-PgD55'},
+                title='foo',
+                content='foo bar baz Foo',
+                date_issued=datetime(2017, 1, 20),
+            )
+            num_indexed, errors = bulk_index_docs(self.es_conn, [doc])
+            self.assertEquals(1, num_indexed)
+            self.assertEquals([], errors)
+        self.index.refresh()
+        self.assertEquals(1, CRECDoc.search().count())
+
+    def test_bulk_indexing_settings(self):
+        with bulk_indexing_settings(self.es_conn, settings.ES_CW_INDEX):
+            response = self.es_conn.indices.get_settings(index=settings.ES_CW_INDEX)
+            index_settings = response[settings.ES_CW_INDEX]['settings']['index']
+            self.assertEquals('-1', index_settings['refresh_interval'])
+            self.assertEquals('0', index_settings['number_of_replicas'])
+        response = self.es_conn.indices.get_settings(index=settings.ES_CW_INDEX)
+        index_settings = response[settings.ES_CW_INDEX]['settings']['index']
+        self.assertNotEqual('-1', index_settings.get('refresh_interval'))
+
+
 class SearchByFieldTestCase(TestCase):
 
     def setUp(self):
@@ -179,6 +456,7 @@ class SearchByFieldTestCase(TestCase):
         self.assertEquals(1, len(results))
         self.assertEquals('foo', results[0]['title'])
         self.assertEquals('blah', results[0]['content'])
+        self.assertNotIn('term_counts', results[0])
     
         
     def test_date_filter(self):
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 import logging
+import threading
 from collections import defaultdict
 from datetime import datetime
 from datetime import timedelta
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
 from django.http import JsonResponse
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import Match, Q, Range
@@ -13,7 +16,10 @@ from rest_framework.decorators import api_view
 from django.core.paginator import Paginator
 
 from legislators.models import CongressPerson
+from legislators.cache import get_legislators_version
+from cwapi.models import DailyTermCount, DailyTermCountCoverage, SpeakerTermCount
 from cwapi.es_docs import CRECDoc, get_term_count_in_doc, get_term_count_agg, make_search
+from cwapi.cache import get_term_counts_generation, make_cache_key
 
 
 logger = logging.getLogger(__name__)
@@ -24,6 +30,75 @@ VALID_SEARCH_FIELDS = [
 ]
 
 
+# In process cache of speaker name -> bioguide data (or None for names that
+# don't match a legislator), valid for a single version of the legislators
+# data.
+_speaker_cache = {'version': None, 'speakers': {}}
+_speaker_cache_lock = threading.Lock()
+
+
+def get_speaker_bioguide_data(person):
+    """Returns the bioguide data shown for a speaker in search results.
+    Expects ``person.terms`` to be prefetched.
+
+    Args:
+        person (:class:`legislators.models.CongressPerson`): A legislator.
+
+    Returns:
+        dict: A dict containing the speakers party, a link to their thumbnail
+            image, and a link to their bio page on congress.gov.
+    """
+    bio_page_url = 'https://www.congress.gov/member/{0}/{1}'.format(
+        '-'.join(person.official_full.lower().split()), person.bioguide_id
+    )
+    terms = list(person.terms.all())
+    return {
+        'im_url': person.image_sm,
+        'party': terms[-1].party if terms else None,
+        'bio_page_url': bio_page_url
+    }
+
+
+def match_speakers_to_bioguide(speakers):
+    """Look up speakers in the legislators db by their full names, as they
+    appear in the CREC metadata. Names that have been looked up before are
+    served from an in process cache (refreshed whenever ``loadcongress``
+    runs), the rest are resolved with a single query.
+
+    Args:
+        speakers (iterable): The offical_full names of the speakers, as they
+            should appear in the speakers section of a CREC doc.
+
+    Returns:
+        dict: Maps each speaker name to a dict containing the speakers party,
+            a link to their thumbnail image, and a link to their bio page on
+            congress.gov, or to None if the speaker isn't a legislator.
+    """
+    speakers = set(speakers)
+    version = get_legislators_version()
+    with _speaker_cache_lock:
+        if _speaker_cache['version'] != version:
+            _speaker_cache['version'] = version
+            _speaker_cache['speakers'] = {}
+        cached = _speaker_cache['speakers']
+        matches = {s: cached[s] for s in speakers if s in cached}
+    missing = speakers.difference(matches)
+    if missing:
+        resolved = dict.fromkeys(missing)
+        # TODO: Get most recent entry? Or the one correct for that time?
+        people = CongressPerson.objects.filter(
+            official_full__in=missing
+        ).prefetch_related('terms')
+        for person in people:
+            if resolved[person.official_full] is None:
+                resolved[person.official_full] = get_speaker_bioguide_data(person)
+        matches.update(resolved)
+        with _speaker_cache_lock:
+            if _speaker_cache['version'] == version:
+                _speaker_cache['speakers'].update(resolved)
+    return matches
+
+
 def match_speaker_to_bioguide(speaker):
     """Look up a speaker in the legislators db by their full name, as it 
     appears in the CREC metadata.
@@ -36,16 +111,7 @@ def match_speaker_to_bioguide(speaker):
         dict: A dict containing the speakers party, a link to their thumbnail
             image, and a link to their bio page on congress.gov.
     """
-    # TODO: Get most recent entry? Or the one correct for that time?
-    for person in CongressPerson.objects.filter(official_full=speaker):
-        bio_page_url = 'https://www.congress.gov/member/{0}/{1}'.format(
-            '-'.join(person.official_full.lower().split()), person.bioguide_id
-        )
-        return {
-            'im_url': person.image_sm,
-            'party': person.terms.last().party, 
-            'bio_page_url': bio_page_url
-        }
+    return match_speakers_to_bioguide([speaker])[speaker]
         
 
 def get_date_range_from_args(request):
@@ -88,7 +154,8 @@ def get_text_search_results(start_date, end_date, terms, size=10, offset=0):
     Returns:
         list: A list of CREC documents as dicts, reverse sorted by score.
     """
-    search = CRECDoc.search()
+    # The per term counts are only needed for aggregations.
+    search = CRECDoc.search().source(excludes=['term_counts'])
     for field, search_term in terms.items():
         m = Match(**{field: {'query': search_term, 'type': 'phrase'}})
         search = search.query(m)
@@ -130,9 +197,13 @@ def search_text_match(request):
 
 
 def get_term_counts_histogram(es_conn, term, start_date, end_date):
-    """Runs an elasticsearchs scripted metric aggregation to count the
-    ocurrences of the provided term in the content field of all CREC documents,
-    bucketed by day.
+    """Counts the ocurrences of the provided term in the content field of all
+    CREC documents, bucketed by day.
+
+    Counts are cached per day, so overlapping date ranges reuse each other's
+    results. Days that aren't cached are read from the daily rollup written by
+    the parser, and elasticsearch is only queried for the span of days the
+    rollup doesn't cover yet.
     
     Args:
         es_conn :cls:`elasticsearch.Elasticsearch`: A connection to an
@@ -145,19 +216,57 @@ def get_term_counts_histogram(es_conn, term, start_date, end_date):
         dict: A historam mapping a timestamp (format YYYY-MM-DD) to the count
             for that day.
     """
-    results = get_term_count_in_doc(es_conn, term, start_date, end_date)
-    aggs = get_term_count_agg(results)
-    if aggs is None:
-        raise Exception()
-    histogram = {}
+    generation = get_term_counts_generation()
+    cache_keys = {}
     dt = start_date
     while dt <= end_date:
-        histogram[dt.strftime('%Y-%m-%d')] = 0
+        day = dt.strftime('%Y-%m-%d')
+        cache_keys[day] = make_cache_key('cwapi:term_count', generation, term, day)
         dt += timedelta(days=1)
-    for bucket in aggs:
-        dt = datetime.strptime(bucket['key_as_string'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
-        histogram[dt.strftime('%Y-%m-%d')] = bucket['term_counts']['value']
+    cached = cache.get_many(list(cache_keys.values()))
+    histogram = {}
+    missing_days = []
+    for day, key in cache_keys.items():
+        if key in cached:
+            histogram[day] = cached[key]
+        else:
+            histogram[day] = 0
+            missing_days.append(day)
+    if not missing_days:
+        return histogram
+    first_day = datetime.strptime(missing_days[0], '%Y-%m-%d')
+    last_day = datetime.strptime(missing_days[-1], '%Y-%m-%d')
+    covered_days = {
+        d.strftime('%Y-%m-%d') for d in
+        DailyTermCountCoverage.objects.filter(
+            date__gte=first_day, date__lte=last_day
+        ).values_list('date', flat=True)
+    }
+    if covered_days:
+        rollup = DailyTermCount.objects.filter(
+            term=term.lower(), date__gte=first_day, date__lte=last_day
+        ).values_list('date', 'count')
+        for d, count in rollup:
+            day = d.strftime('%Y-%m-%d')
+            if day in covered_days and day in histogram:
+                histogram[day] = count
+    uncovered_days = [day for day in missing_days if day not in covered_days]
+    if uncovered_days:
+        results = get_term_count_in_doc(
+            es_conn,
+            term,
+            datetime.strptime(uncovered_days[0], '%Y-%m-%d'),
+            datetime.strptime(uncovered_days[-1], '%Y-%m-%d'),
+        )
+        aggs = get_term_count_agg(results)
+        if aggs is None:
+            raise Exception()
+        for bucket in aggs:
+            dt = datetime.strptime(bucket['key_as_string'], '%Y-%m-%dT%H:%M:%S.%fZ')
+            day = dt.strftime('%Y-%m-%d')
+            if day in histogram and day not in covered_days:
+                histogram[day] = bucket['term_counts']['value']
+    cache.set_many({cache_keys[day]: histogram[day] for day in missing_days})
     return histogram
 
 
@@ -183,6 +292,26 @@ def search_results_page(request):
     size = request.GET.get('size', 10)
     offset = request.GET.get('offset', 0)
     start_date, end_date = get_date_range_from_args(request)
+    cache_key = make_cache_key(
+        'cwapi:search_results_page',
+        get_term_counts_generation(),
+        get_legislators_version(), term, start_date, end_date, days_ago,
+        size, offset,
+    )
+    payload = cache.get(cache_key)
+    if payload is None:
+        payload = get_search_results_page(
+            es_conn, term, start_date, end_date, days_ago, size, offset
+        )
+        cache.set(cache_key, payload)
+    return JsonResponse(payload)
+
+
+def get_search_results_page(es_conn, term, start_date, end_date, days_ago,
+                            size, offset):
+    """Builds the payload for the search results page: daily counts of the
+    term for the current and previous period, and the top matching docs.
+    """
     prev_start_date = start_date - timedelta(days=int(days_ago))
     prev_end_date = end_date - timedelta(days=int(days_ago))
     current_histogram = get_term_counts_histogram(
@@ -196,6 +325,9 @@ def search_results_page(request):
     docs = get_text_search_results(
         start_date, end_date, {'content': term}, size=size, offset=offset
     )
+    speaker_matches = match_speakers_to_bioguide(
+        s for doc in docs for s in doc.get('speakers', '').split(',')
+    )
     for doc in docs:
         doc['mentions'] = doc['content'].lower().count(term.lower())
         doc['search_phrase'] = term
@@ -209,27 +341,75 @@ def search_results_page(request):
         speakers = doc.get('speakers', '').split(',')
         doc['speakers'] = []
         for s in speakers:
-            matched_bioguide_data = match_speaker_to_bioguide(s)
+            matched_bioguide_data = speaker_matches[s]
             if matched_bioguide_data:
                 doc['speakers'].append(matched_bioguide_data)
-    return JsonResponse(
-        {
-            'delta': int(100 * ((current_total - prev_total) / float(max(prev_total, 1)))),
-            'docs': docs,
-            'term': term,
-            'current_period': {
-                'daily_breakdown': [
-                    {'date': k, 'count': v} for k, v in current_histogram.items()
-                ],
-                'total_count': current_total
-            },
-            'previous_period': {
-                'daily_breakdown': [
-                    {'date': k, 'count': v} for k, v in prev_histogram.items()
-                ],
-                'total_count': prev_total
-            },
-            'start_date': start_date,
-            'end_date': end_date,
-        }
+    return {
+        'delta': int(100 * ((current_total - prev_total) / float(max(prev_total, 1)))),
+        'docs': docs,
+        'term': term,
+        'current_period': {
+            'daily_breakdown': [
+                {'date': k, 'count': v} for k, v in current_histogram.items()
+            ],
+            'total_count': current_total
+        },
+        'previous_period': {
+            'daily_breakdown': [
+                {'date': k, 'count': v} for k, v in prev_histogram.items()
+            ],
+            'total_count': prev_total
+        },
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+
+
+def get_top_speaker_terms(bioguide_id, start_date, end_date, term_type=None,
+                          size=10):
+    """Returns the named entities and noun chunks a legislator mentioned most
+    often in CREC documents issued within a date range.
+
+    Args:
+        bioguide_id (str): The bioguide id of the legislator.
+        start_date (datetime): Start of date range.
+        end_date (datetime): End of date range.
+        term_type (str): If provided, only count terms whose type starts
+            with this value, e.g. "noun_chunks", "named_entities" or
+            "named_entities_PERSON".
+        size (int): The number of terms to return, defaults to 10.
+
+    Returns:
+        list: A list of dicts with the term, its type and its total count,
+            reverse sorted by count.
+    """
+    term_counts = SpeakerTermCount.objects.filter(
+        bioguide_id=bioguide_id,
+        date__gte=start_date,
+        date__lte=end_date,
+    )
+    if term_type:
+        term_counts = term_counts.filter(type__startswith=term_type)
+    term_counts = term_counts.values('term', 'type').annotate(
+        count=Sum('count')
+    ).order_by('-count', 'term')
+    return list(term_counts[:size])
+
+
+@api_view(['GET'])
+def speaker_terms(request):
+    """Returns the top terms for a legislator (by bioguide_id) over a date
+    range, optionally limited to a type of term.
+    """
+    start_date, end_date = get_date_range_from_args(request)
+    data = get_top_speaker_terms(
+        request.GET.get('bioguide_id', '').strip(),
+        start_date,
+        end_date,
+        term_type=request.GET.get('type', '').strip(),
+        size=int(request.GET.get('size', 10)),
     )
+    return JsonResponse({
+        'status': 'success',
+        'data': data
+    })
@@ -0,0 +1,125 @@
+import json
+import uuid
+import hashlib
+import threading
+from collections import defaultdict
+from datetime import date
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from legislators.models import DataVersion, get_current_legislators
+from legislators.serializers import CongressPersonSerializer
+
+
+LEGISLATORS_VERSION_NAME = 'legislators'
+CURRENT_SNAPSHOT_KEY_PREFIX = 'legislators:current'
+
+_current_snapshot = {'key': None, 'snapshot': None}
+_current_snapshot_lock = threading.Lock()
+
+
+def get_legislators_version():
+    """Returns the version of the legislators data currently loaded in the db.
+    Anything derived from legislators that is cached, in process or in the
+    django cache, should be keyed on this value so it is rebuilt after
+    ``loadcongress`` runs. The version is stored in the db, rather than the
+    cache, so every process sees it change even when the cache backend isn't
+    shared between them.
+
+    Returns:
+        str: An opaque version identifier.
+    """
+    version = DataVersion.objects.filter(
+        name=LEGISLATORS_VERSION_NAME
+    ).values_list('version', flat=True).first()
+    if version is None:
+        version = DataVersion.objects.get_or_create(
+            name=LEGISLATORS_VERSION_NAME,
+            defaults={'version': uuid.uuid4().hex},
+        )[0].version
+    return version
+
+
+def bump_legislators_version():
+    """Marks everything cached from the legislators data as stale.
+    """
+    DataVersion.objects.update_or_create(
+        name=LEGISLATORS_VERSION_NAME,
+        defaults={'version': uuid.uuid4().hex},
+    )
+
+
+def make_json_entry(data):
+    """Serializes data for a JSON response.
+
+    Returns:
+        tuple: The response body (bytes) and its ETag.
+    """
+    body = json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
+    return body, '"{0}"'.format(hashlib.sha1(body).hexdigest())
+
+
+def build_current_snapshot():
+    """Serializes the current legislators, all of them and by the state of
+    their current term.
+
+    Returns:
+        dict: Maps None (for all states) and each state's 2 letter code to the
+            JSON response body and ETag for its legislators.
+    """
+    today = date.today()
+    people = list(
+        get_current_legislators().prefetch_related('terms', 'external_ids')
+    )
+    data = CongressPersonSerializer(people, many=True).data
+    by_state = defaultdict(list)
+    for person, person_data in zip(people, data):
+        states = {
+            t.state_id for t in person.terms.all()
+            if t.start_date <= today <= t.end_date
+        }
+        for state in states:
+            by_state[state].append(person_data)
+    snapshot = {None: make_json_entry(data)}
+    for state, state_data in by_state.items():
+        snapshot[state] = make_json_entry(state_data)
+    return snapshot
+
+
+def get_current_snapshot():
+    """Returns the snapshot of the current legislators (see
+    :func:`build_current_snapshot`), from process memory or the django cache
+    if it was already built for this version of the legislators data (and
+    today's date, since that decides who is current).
+    """
+    version = get_legislators_version()
+    key = '{0}:{1}:{2}'.format(
+        CURRENT_SNAPSHOT_KEY_PREFIX, version, date.today().isoformat()
+    )
+    with _current_snapshot_lock:
+        if _current_snapshot['key'] == key:
+            return _current_snapshot['snapshot']
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_current_snapshot()
+        cache.set(key, snapshot)
+    with _current_snapshot_lock:
+        _current_snapshot['key'] = key
+        _current_snapshot['snapshot'] = snapshot
+    return snapshot
+
+
+def get_current_legislators_json(state=None):
+    """
+    Args:
+        state (str): Optional 2 letter state code to filter by.
+
+    Returns:
+        tuple: The JSON response body (bytes) listing the current legislators,
+            and its ETag.
+    """
+    snapshot = get_current_snapshot()
+    if state in snapshot:
+        return snapshot[state]
+    return make_json_entry([])
@@ -1,29 +1,109 @@
-import yaml
+import hashlib
+import logging
 import os
+import pickle
+import tempfile
+
+import yaml
+from django.conf import settings
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 
 DATA_DIR = 'external_data'
 
+# Bump when the snapshot format changes.
+SNAPSHOT_VERSION = '1'
+
+logger = logging.getLogger(__name__)
+
 
 def get_path_to_file(yaml_file):
     return "{}/{}/{}".format(os.getcwd(), DATA_DIR, yaml_file)
 
 
+def get_snapshot_dir():
+    """Directory parsed yaml files are snapshotted to, created (readable only
+    by the current user) if it doesn't exist yet. Returns None if it can't be
+    used, since snapshots are unpickled it must not be writable by anyone
+    else.
+    """
+    snapshot_dir = settings.LEGISLATORS_SNAPSHOT_DIR
+    if not snapshot_dir:
+        return None
+    try:
+        os.makedirs(snapshot_dir, mode=0o700, exist_ok=True)
+        st = os.stat(snapshot_dir)
+    except OSError:
+        logger.warning('Could not create snapshot dir {0}.'.format(snapshot_dir))
+        return None
+    if hasattr(os, 'getuid') and (
+            st.st_uid != os.getuid() or st.st_mode & 0o022):
+        logger.warning(
+            'Not using snapshot dir {0}, it is writable by other users.'.format(
+                snapshot_dir
+            )
+        )
+        return None
+    return snapshot_dir
+
+
+def load_yaml(path):
+    """Loads a yaml file, with the C loader if libyaml is available. The
+    parsed data is snapshotted with pickle, keyed by a hash of the file's
+    contents, so loading the same file again skips parsing it.
+
+    Args:
+        path (str): Path to the yaml file.
+
+    Returns:
+        The parsed data.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    snapshot_dir = get_snapshot_dir()
+    if snapshot_dir is None:
+        return yaml.load(raw, Loader=YamlLoader)
+    snapshot_path = os.path.join(
+        snapshot_dir,
+        '{0}.{1}.pickle'.format(
+            os.path.basename(path),
+            hashlib.sha1(SNAPSHOT_VERSION.encode('utf-8') + raw).hexdigest(),
+        ),
+    )
+    try:
+        with open(snapshot_path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logger.warning('Ignoring unreadable snapshot {0}.'.format(snapshot_path))
+    data = yaml.load(raw, Loader=YamlLoader)
+    try:
+        # Written to a temp file first so concurrent loads never see a
+        # partial snapshot.
+        fd, tmp_path = tempfile.mkstemp(dir=snapshot_dir)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    except OSError:
+        logger.warning('Could not write snapshot {0}.'.format(snapshot_path))
+    return data
+
+
 def load_legislators_current():
     """
     Loads the legislators-current.yaml
     :return: dict of the data
     """
-    file = get_path_to_file('legislators-current.yaml')
-    with open(file, 'r') as f:
-        return yaml.load(f)
+    return load_yaml(get_path_to_file('legislators-current.yaml'))
 
 
 def load_legislators_past():
     """
-    Loads the legislators-current.yaml
+    Loads the legislators-historical.yaml
     :return: dict of the data
     """
-    file = get_path_to_file('legislators-historical.yaml')
-    with open(file, 'r') as f:
-        return yaml.load(f)
-
+    return load_yaml(get_path_to_file('legislators-historical.yaml'))
@@ -1,76 +1,201 @@
-from datetime import datetime
+from collections import Counter
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from legislators.models import State, CongressPerson, ExternalId, Term
 from legislators.importer import load_legislators_current, load_legislators_past
+from legislators.cache import bump_legislators_version, get_current_snapshot
 
-date_format = '%Y-%m-%d'
 
+TERM_FIELDS = (
+    'party', 'state_rank', 'district', 'caucus', 'address', 'office', 'phone',
+    'fax', 'contact_form', 'rss_url', 'url',
+)
 
-def make_person(bio, name):
 
-    person = CongressPerson(first_name=name['first'], last_name=name['last'])
+BULK_CREATE_BATCH_SIZE = 500
 
-    if 'official_full' in name:
-        person.official_full = name['official_full']
-    if 'middle' in name:
-        person.middle_name = name['middle']
-    if 'suffix' in name:
-        person.suffix = name['suffix']
-    if 'nickname' in name:
-        person.nickname = name['nickname']
 
-    person.gender = bio['gender']
-    if 'religion' in bio:
-        person.religion = bio['religion']
-    if 'birthday' in bio:
-        person.birthday = bio['birthday']
+def normalize(model, values):
+    """Converts values from the yaml files to the python types of the model's
+    fields, so they compare equal to the same values loaded from the db.
 
-    person.save()
-    return person
+    Args:
+        model: A django model class.
+        values (dict): Field name to raw value.
 
+    Returns:
+        dict: Field name to python value.
+    """
+    return {
+        k: model._meta.get_field(k).to_python(v) for k, v in values.items()
+    }
 
-def make_term(person, term):
-    defaults = {}
-    state = State.objects.get(short=term['state'])
-    start = datetime.strptime(term['start'], date_format)
-    end = datetime.strptime(term['end'], date_format)
-    for p in ['party', 'state_rank', 'district', 'caucus', 'address', 'office', 'phone', 'fax',
-              'contact_form', 'rss_url', 'url']:
-        if p in term:
-            defaults[p] = term[p]
-    if 'class' in term:
-        defaults['election_class'] = term['class']
 
-    obj, created = person.terms.update_or_create(
-        state=state, start_date=start, end_date=end, type=term['type'], defaults=defaults)
+def person_values(rep):
+    values = {}
+    values.update(rep['name'])
+    values.update(rep['bio'])
+    return normalize(CongressPerson, values)
 
 
-def load_data(data, out):
-    for rep in data:
-        defaults = {}
-        defaults.update(rep['name'])
-        defaults.update(rep['bio'])
-        print(rep['name'])
-        obj, created = CongressPerson.objects.update_or_create(
-            bioguide_id=rep['id']['bioguide'],
-            defaults=defaults,
+def term_key(term):
+    return (
+        term['person_id'], term['state_id'], term['start_date'],
+        term['end_date'], term['type'],
+    )
+
+
+def term_values(bioguide_id, term, states):
+    if term['state'] not in states:
+        raise State.DoesNotExist(
+            'Unknown state {0} for {1}.'.format(term['state'], bioguide_id)
         )
+    values = {p: term[p] for p in TERM_FIELDS if p in term}
+    if 'class' in term:
+        values['election_class'] = term['class']
+    values.update(
+        person_id=bioguide_id,
+        state_id=term['state'],
+        start_date=term['start'],
+        end_date=term['end'],
+        type=term['type'],
+    )
+    return normalize(Term, values)
+
+
+def stage_row(rows, key, values, inserts, updates):
+    """Diffs ``values`` against the existing row for ``key``, staging either
+    an insert of a new row or an update of just the fields that changed.
+    Fields missing from ``values`` are left as they are.
+
+    Args:
+        rows (dict): Key to dict of field values, for every existing row. New
+            rows are added as they are staged.
+        key: Identifies the row.
+        values (dict): Field values from the yaml files.
+        inserts (dict): Key to field values for rows to create.
+        updates (dict): Key to changed field values for rows to update.
+    """
+    row = rows.get(key)
+    if row is None:
+        row = rows[key] = inserts[key] = {}
+    changed = {k: v for k, v in values.items() if k not in row or row[k] != v}
+    row.update(changed)
+    if changed and key not in inserts:
+        updates.setdefault(key, {}).update(changed)
+
+
+def load_data(data, out=None):
+    """Loads legislators from the yaml data into the db. Existing rows are
+    read up front and diffed in memory, so only new rows are inserted (in
+    bulk) and only changed rows are updated.
+
+    Args:
+        data (list of dict): Legislators, as loaded by
+            :func:`legislators.importer.load_legislators_current` or
+            :func:`legislators.importer.load_legislators_past`.
+        out: Optional stream the counts are written to.
+
+    Returns:
+        dict: For each of "people", "terms" and "external_ids", a
+            :class:`collections.Counter` of the rows inserted, updated and
+            unchanged.
+    """
+    states = set(State.objects.values_list('short', flat=True))
+    people = {
+        p['bioguide_id']: p for p in CongressPerson.objects.order_by().values()
+    }
+    terms = {term_key(t): t for t in Term.objects.order_by().values()}
+    external_ids = set(
+        ExternalId.objects.values_list('person_id', 'type', 'value')
+    )
+    new_people, person_updates, seen_people = {}, {}, set()
+    new_terms, term_updates, seen_terms = {}, {}, set()
+    new_external_ids, seen_external_ids = [], set()
+    for rep in data:
+        bioguide_id = rep['id']['bioguide']
+        values = person_values(rep)
+        values['bioguide_id'] = bioguide_id
+        stage_row(people, bioguide_id, values, new_people, person_updates)
+        seen_people.add(bioguide_id)
         for k, v in rep['id'].items():
-            obj.external_ids.update_or_create(type=k, value=v)
+            external_id = (bioguide_id, k, str(v))
+            if external_id not in external_ids:
+                external_ids.add(external_id)
+                new_external_ids.append(external_id)
+            seen_external_ids.add(external_id)
         for term in rep['terms']:
-            make_term(obj, term)
+            values = term_values(bioguide_id, term, states)
+            key = term_key(values)
+            stage_row(terms, key, values, new_terms, term_updates)
+            seen_terms.add(key)
+
+    with transaction.atomic():
+        CongressPerson.objects.bulk_create(
+            [CongressPerson(**values) for values in new_people.values()],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        for bioguide_id, changed in person_updates.items():
+            CongressPerson.objects.filter(pk=bioguide_id).update(**changed)
+        Term.objects.bulk_create(
+            [Term(**values) for values in new_terms.values()],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        for key, changed in term_updates.items():
+            Term.objects.filter(pk=terms[key]['id']).update(**changed)
+        ExternalId.objects.bulk_create(
+            [
+                ExternalId(person_id=person_id, type=type, value=value)
+                for person_id, type, value in new_external_ids
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+
+    counts = {
+        'people': Counter(
+            inserted=len(new_people),
+            updated=len(person_updates),
+            unchanged=len(seen_people) - len(new_people) - len(person_updates),
+        ),
+        'terms': Counter(
+            inserted=len(new_terms),
+            updated=len(term_updates),
+            unchanged=len(seen_terms) - len(new_terms) - len(term_updates),
+        ),
+        'external_ids': Counter(
+            inserted=len(new_external_ids),
+            updated=0,
+            unchanged=len(seen_external_ids) - len(new_external_ids),
+        ),
+    }
+    if out is not None:
+        for name, c in counts.items():
+            out.write(
+                '{0}: {1} inserted, {2} updated, {3} unchanged'.format(
+                    name, c['inserted'], c['updated'], c['unchanged']
+                )
+            )
+    return counts
 
 
 class Command(BaseCommand):
     help = 'Loads congress yaml files'
 
     def handle(self, *args, **options):
-        data = load_legislators_current()
-        self.stdout.write("Got data for current legislators")
-        load_data(data, self.stdout)
-
-        data = load_legislators_past()
-        self.stdout.write("Got data for past legislators")
-        load_data(data, self.stdout)
+        with transaction.atomic():
+            data = load_legislators_current()
+            self.stdout.write("Got data for current legislators")
+            load_data(data, self.stdout)
+
+            data = load_legislators_past()
+            self.stdout.write("Got data for past legislators")
+            load_data(data, self.stdout)
+
+            # Committed along with the data, so no process can cache the new
+            # data under the old version.
+            bump_legislators_version()
+        # Built now, rather than by the first request for current legislators
+        # (only saves work if the django cache is shared with the web servers).
+        get_current_snapshot()
@@ -68,6 +68,18 @@ class ExternalId(models.Model):
     value = models.CharField(max_length=50)
 
 
+class DataVersion(models.Model):
+    """
+    Current version of a dataset, changed whenever it's reloaded so that
+    every process can tell when what it has cached from it is stale.
+    """
+    def __str__(self):
+        return "{} - {}".format(self.name, self.version)
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.CharField(max_length=32)
+
+
 def get_current_legislators():
     """
     Filter legislators based on terms
@@ -77,6 +89,7 @@ def get_current_legislators():
     :return:
     """
     results = CongressPerson.objects.filter(terms__start_date__lte=date.today(), terms__end_date__gte=date.today())
-    return results
+    # People with more than one matching term would otherwise be repeated.
+    return results.distinct()
 
 
@@ -17,7 +17,22 @@ class ExternalIdSerializer(serializers.ModelSerializer):
         fields = ('type', 'value')
 
 
-class CongressPersonSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin(object):
+    """
+    Lets a serializer take an optional `fields` argument, a list of the field
+    names to include in its output, e.g. CongressPersonSerializer(people,
+    many=True, fields=['bioguide_id', 'official_full'])
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super(DynamicFieldsMixin, self).__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CongressPersonSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     terms = TermSerializer(many=True)
     external_ids = ExternalIdSerializer(many=True)
 
@@ -27,12 +42,10 @@ class CongressPersonSerializer(serializers.ModelSerializer):
                   'gender', 'religion', 'terms', 'external_ids', 'image_lg', 'image_sm',)
 
 
-class CongressPersonShortSerializer(serializers.ModelSerializer):
+class CongressPersonShortSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     terms = TermSerializer(many=True)
 
     class Meta:
         model = CongressPerson
         fields = ('bioguide_id', 'first', 'middle', 'last', 'suffix', 'official_full', 'birthday',
                   'gender', 'religion', 'terms', 'image_lg', 'image_sm',)
-
-
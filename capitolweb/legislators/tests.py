@@ -1,6 +1,346 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import io
+import os
+import copy
+import json
+import shutil
+import tempfile
+from datetime import date
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
 from django.test import TestCase
+from django.test import override_settings
+from freezegun import freeze_time
+
+from legislators import importer
+from legislators import views
+from legislators import cache as legislators_cache
+from legislators.cache import bump_legislators_version
+from legislators.models import CongressPerson, ExternalId, Term
+from legislators.management.commands.loadcongress import load_data
+
+
+LEGISLATORS = [
+    {
+        'id': {
+            'bioguide': 'B000944',
+            'thomas': '00136',
+            'govtrack': 400050,
+            'fec': ['H2OH13033', 'S6OH00163'],
+        },
+        'name': {
+            'first': 'Sherrod',
+            'last': 'Brown',
+            'official_full': 'Sherrod Brown',
+        },
+        'bio': {
+            'birthday': '1952-11-09',
+            'gender': 'M',
+            'religion': 'Lutheran',
+        },
+        'terms': [
+            {
+                'type': 'rep',
+                'start': '1993-01-05',
+                'end': '1995-01-03',
+                'state': 'OH',
+                'district': 13,
+                'party': 'Democrat',
+            },
+            {
+                'type': 'sen',
+                'start': '2013-01-03',
+                'end': '2019-01-03',
+                'state': 'OH',
+                'class': 1,
+                'party': 'Democrat',
+                'state_rank': 'senior',
+                'url': 'https://www.brown.senate.gov',
+            },
+        ],
+    },
+    {
+        'id': {'bioguide': 'C000127', 'govtrack': 300018},
+        'name': {
+            'first': 'Maria',
+            'last': 'Cantwell',
+            'official_full': 'Maria Cantwell',
+        },
+        'bio': {'birthday': '1958-10-13', 'gender': 'F'},
+        'terms': [
+            {
+                'type': 'sen',
+                'start': '2001-01-03',
+                'end': '2007-01-03',
+                'state': 'WA',
+                'class': 1,
+                'party': 'Democrat',
+            },
+        ],
+    },
+]
+
+
+class LoadCongressTestCase(TestCase):
+
+    def test_load_data(self):
+        counts = load_data(LEGISLATORS)
+        self.assertEqual(2, counts['people']['inserted'])
+        self.assertEqual(3, counts['terms']['inserted'])
+        self.assertEqual(6, counts['external_ids']['inserted'])
+        person = CongressPerson.objects.get(pk='B000944')
+        self.assertEqual('Sherrod Brown', person.official_full)
+        self.assertEqual(date(1952, 11, 9), person.birthday)
+        term = person.terms.get(type='sen')
+        self.assertEqual('OH', term.state_id)
+        self.assertEqual('1', term.election_class)
+        self.assertEqual(-1, term.district)
+        self.assertEqual(13, person.terms.get(type='rep').district)
+        self.assertEqual(
+            '400050', person.external_ids.get(type='govtrack').value
+        )
+        self.assertEqual(
+            'B000944',
+            ExternalId.objects.get(type='bioguide', value='B000944').person_id,
+        )
+
+    def test_reload_is_unchanged(self):
+        load_data(LEGISLATORS)
+        # Reads of the existing rows, plus the (empty) transaction.
+        with self.assertNumQueries(6):
+            counts = load_data(LEGISLATORS)
+        for name, c in counts.items():
+            self.assertEqual(0, c['inserted'], name)
+            self.assertEqual(0, c['updated'], name)
+        self.assertEqual(2, counts['people']['unchanged'])
+        self.assertEqual(3, counts['terms']['unchanged'])
+        self.assertEqual(2, CongressPerson.objects.count())
+        self.assertEqual(3, Term.objects.count())
+        self.assertEqual(6, ExternalId.objects.count())
+
+    def test_reload_updates_changed_rows(self):
+        load_data(LEGISLATORS)
+        data = copy.deepcopy(LEGISLATORS)
+        data[1]['bio']['religion'] = 'Roman Catholic'
+        data[1]['terms'][0]['party'] = 'Independent'
+        data[1]['terms'].append({
+            'type': 'sen',
+            'start': '2007-01-04',
+            'end': '2013-01-03',
+            'state': 'WA',
+            'class': 1,
+            'party': 'Democrat',
+        })
+        counts = load_data(data)
+        self.assertEqual(
+            {'inserted': 0, 'updated': 1, 'unchanged': 1}, counts['people']
+        )
+        self.assertEqual(
+            {'inserted': 1, 'updated': 1, 'unchanged': 2}, counts['terms']
+        )
+        person = CongressPerson.objects.get(pk='C000127')
+        self.assertEqual('Roman Catholic', person.religion)
+        self.assertEqual(
+            ['Independent', 'Democrat'],
+            [t.party for t in person.terms.all()],
+        )
+
+
+class LoadYamlTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.snapshot_dir = os.path.join(self.tmp_dir, 'snapshots')
+        self.yaml_path = os.path.join(self.tmp_dir, 'legislators.yaml')
+        with open(self.yaml_path, 'w') as f:
+            f.write("- id:\n    bioguide: B000944\n    govtrack: 400050\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_snapshot(self):
+        expected = [{'id': {'bioguide': 'B000944', 'govtrack': 400050}}]
+        with override_settings(LEGISLATORS_SNAPSHOT_DIR=self.snapshot_dir):
+            self.assertEqual(expected, importer.load_yaml(self.yaml_path))
+            self.assertEqual(1, len(os.listdir(self.snapshot_dir)))
+            with mock.patch.object(importer.yaml, 'load') as load:
+                self.assertEqual(expected, importer.load_yaml(self.yaml_path))
+            load.assert_not_called()
+            # Changing the file invalidates the snapshot.
+            with open(self.yaml_path, 'a') as f:
+                f.write("- id:\n    bioguide: C000127\n")
+            self.assertEqual(2, len(importer.load_yaml(self.yaml_path)))
+            self.assertEqual(2, len(os.listdir(self.snapshot_dir)))
+
+    def test_no_snapshot(self):
+        with override_settings(LEGISLATORS_SNAPSHOT_DIR=''):
+            self.assertEqual(
+                'B000944', importer.load_yaml(self.yaml_path)[0]['id']['bioguide']
+            )
+        self.assertFalse(os.path.exists(self.snapshot_dir))
+
+
+class LegislatorViewsTestCase(TestCase):
+
+    def setUp(self):
+        data = copy.deepcopy(LEGISLATORS)
+        for i in range(5):
+            rep = copy.deepcopy(LEGISLATORS[1])
+            rep['id'] = {'bioguide': 'X00000{0}'.format(i), 'govtrack': i}
+            rep['name']['official_full'] = 'Person {0}'.format(i)
+            rep['terms'][0]['end'] = '2017-01-03'
+            data.append(rep)
+        load_data(data)
+        bump_legislators_version()
+
+    def test_search_by_params(self):
+        # One query for people, plus one each for their terms and external ids.
+        with self.assertNumQueries(3):
+            response = self.client.get('/legislators/search/')
+        people = response.json()
+        self.assertEqual(7, len(people))
+        brown = next(p for p in people if p['bioguide_id'] == 'B000944')
+        self.assertEqual(2, len(brown['terms']))
+        self.assertEqual(4, len(brown['external_ids']))
+        with self.assertNumQueries(3):
+            response = self.client.get('/legislators/search/?state=OH')
+        self.assertEqual(
+            ['B000944'], [p['bioguide_id'] for p in response.json()]
+        )
+
+    def test_search_pagination(self):
+        expected = list(
+            CongressPerson.objects.order_by('official_full', 'bioguide_id')
+            .values_list('bioguide_id', flat=True)
+        )
+        seen = []
+        url = '/legislators/search/?limit=3'
+        while True:
+            response = self.client.get(url)
+            self.assertTrue(len(response.json()) <= 3)
+            seen.extend(p['bioguide_id'] for p in response.json())
+            if views.NEXT_CURSOR_HEADER not in response:
+                break
+            url = '/legislators/search/?limit=3&cursor={0}'.format(
+                response[views.NEXT_CURSOR_HEADER]
+            )
+        self.assertEqual(expected, seen)
+
+    def test_search_fields(self):
+        response = self.client.get('/legislators/search/?fields=short')
+        self.assertNotIn('external_ids', response.json()[0])
+        self.assertIn('terms', response.json()[0])
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                '/legislators/search/?fields=bioguide_id,official_full'
+            )
+        self.assertEqual(
+            {'bioguide_id', 'official_full'}, set(response.json()[0])
+        )
+        for query in ('fields=bogus', 'limit=0', 'limit=x', 'cursor=x'):
+            response = self.client.get('/legislators/search/?' + query)
+            self.assertEqual(400, response.status_code, query)
+
+    def test_search_export(self):
+        with mock.patch.object(views, 'EXPORT_CHUNK_SIZE', 3):
+            response = self.client.get('/legislators/search/?export&limit=1')
+            people = json.loads(
+                b''.join(response.streaming_content).decode('utf-8')
+            )
+        self.assertEqual(7, len(people))
+        self.assertEqual(
+            self.client.get('/legislators/search/').json(), people
+        )
+
+    @freeze_time('2015-06-01')
+    def test_list_current(self):
+        # The legislators version, then the people, their terms and their
+        # external ids for the snapshot.
+        with self.assertNumQueries(4):
+            response = self.client.get('/legislators/current/')
+        people = response.json()
+        self.assertEqual(6, len(people))
+        self.assertEqual(
+            len(people), len({p['bioguide_id'] for p in people})
+        )
+        self.assertNotIn('C000127', {p['bioguide_id'] for p in people})
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'legislators-test',
+    },
+    'loadcongress': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'legislators-loadcongress-test',
+    },
+})
+@freeze_time('2015-06-01')
+class CurrentSnapshotTestCase(TestCase):
+
+    def setUp(self):
+        load_data(LEGISLATORS)
+        bump_legislators_version()
+
+    def test_list_current(self):
+        response = self.client.get('/legislators/current/')
+        self.assertEqual(['B000944'], [p['bioguide_id'] for p in response.json()])
+        etag = response['ETag']
+        # Served from the in process snapshot once the version is checked.
+        with self.assertNumQueries(1):
+            response = self.client.get('/legislators/current/')
+        self.assertEqual(etag, response['ETag'])
+        response = self.client.get(
+            '/legislators/current/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.content)
+
+    def test_list_current_by_state(self):
+        response = self.client.get('/legislators/current/?state=oh')
+        self.assertEqual(['B000944'], [p['bioguide_id'] for p in response.json()])
+        response = self.client.get('/legislators/current/?state=WA')
+        self.assertEqual([], response.json())
+        self.assertIn('ETag', response)
+
+    def test_rebuilt_after_new_version(self):
+        etag = self.client.get('/legislators/current/')['ETag']
+        data = copy.deepcopy(LEGISLATORS)
+        data[1]['terms'][0]['end'] = '2019-01-03'
+        load_data(data)
+        bump_legislators_version()
+        response = self.client.get(
+            '/legislators/current/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+        self.assertEqual(2, len(response.json()))
 
-# Create your tests here.
+    def test_rebuilt_after_loadcongress(self):
+        etag = self.client.get('/legislators/current/')['ETag']
+        data = copy.deepcopy(LEGISLATORS)
+        data[1]['terms'][0]['end'] = '2019-01-03'
+        # loadcongress runs in its own process, so it doesn't share a local
+        # memory cache with the web servers.
+        with mock.patch.object(legislators_cache, 'cache', caches['loadcongress']), \
+                mock.patch(
+                    'legislators.management.commands.loadcongress.'
+                    'load_legislators_current', return_value=data), \
+                mock.patch(
+                    'legislators.management.commands.loadcongress.'
+                    'load_legislators_past', return_value=[]):
+            call_command('loadcongress', stdout=io.StringIO())
+        response = self.client.get(
+            '/legislators/current/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+        self.assertEqual(
+            ['B000944', 'C000127'],
+            sorted(p['bioguide_id'] for p in response.json()),
+        )
@@ -1,12 +1,142 @@
 # -*- coding: utf-8 -*-
 from .models import CongressPerson, ExternalId, get_current_legislators
 from rest_framework.decorators import api_view
+import json
 import logging
-from django.http import JsonResponse
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from legislators.cache import get_current_legislators_json
 from legislators.serializers import CongressPersonSerializer, CongressPersonShortSerializer
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK_SIZE = 500
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def prefetch_people(people, fields=CongressPersonSerializer.Meta.fields):
+    """Dedupes people matched through their terms and prefetches the related
+    objects that will be serialized, so serializing any number of people takes
+    a constant number of queries.
+
+    :param people: CongressPerson queryset
+    :param fields: names of the fields that will be serialized
+    :return: the prefetching queryset
+    """
+    return people.distinct().prefetch_related(
+        *[r for r in ('terms', 'external_ids') if r in fields]
+    )
+
+
+def encode_cursor(person):
+    """
+    Opaque cursor pointing just past a person in (official_full, bioguide_id)
+    order
+    :param person: the last CongressPerson of a page
+    :return: the cursor string
+    """
+    return urlsafe_b64encode(
+        json.dumps([person.official_full, person.bioguide_id]).encode('utf-8')
+    ).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    :param cursor: a cursor from encode_cursor
+    :return: (official_full, bioguide_id) tuple
+    :raises ValueError: if the cursor is invalid
+    """
+    try:
+        official_full, bioguide_id = json.loads(
+            urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        )
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor.')
+    return official_full, bioguide_id
+
+
+def parse_limit(limit):
+    """
+    :param limit: the limit query param, if any
+    :return: the page size, capped at MAX_PAGE_SIZE
+    :raises ValueError: if the limit isn't a positive integer
+    """
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValueError('limit must be a positive integer.')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def get_person_serializer(fields):
+    """
+    Picks the serializer for the fields query param: "short" for the
+    CongressPersonShortSerializer shape, otherwise a comma separated subset of
+    the CongressPersonSerializer fields (all of them if not given).
+    :param fields: the fields query param, if any
+    :return: (serializer class, list of field names or None for all of them)
+    :raises ValueError: for unknown field names
+    """
+    if not fields:
+        return CongressPersonSerializer, None
+    if fields == 'short':
+        return CongressPersonShortSerializer, None
+    fields = fields.split(',')
+    unknown = set(fields) - set(CongressPersonSerializer.Meta.fields)
+    if unknown:
+        raise ValueError('Unknown fields: {}.'.format(', '.join(sorted(unknown))))
+    return CongressPersonSerializer, fields
+
+
+def page_after(people, cursor, limit):
+    """
+    Keyset pagination over people ordered by (official_full, bioguide_id),
+    which stays fast however deep the page is.
+    :param people: CongressPerson queryset
+    :param cursor: (official_full, bioguide_id) of the last person of the
+        previous page, or None for the first page
+    :param limit: page size
+    :return: the queryset for the page
+    """
+    people = people.order_by('official_full', 'bioguide_id')
+    if cursor is not None:
+        official_full, bioguide_id = cursor
+        people = people.filter(
+            Q(official_full__gt=official_full) |
+            Q(official_full=official_full, bioguide_id__gt=bioguide_id)
+        )
+    return people[:limit]
+
+
+def stream_people(people, serializer_class, fields):
+    """
+    Serializes all of the people as a JSON list, a chunk at a time.
+    :return: generator of strings
+    """
+    yield '['
+    cursor = None
+    separator = ''
+    while True:
+        page = list(page_after(people, cursor, EXPORT_CHUNK_SIZE))
+        if not page:
+            break
+        data = serializer_class(page, many=True, fields=fields).data
+        yield separator + ','.join(json.dumps(d, cls=DjangoJSONEncoder) for d in data)
+        separator = ','
+        if len(page) < EXPORT_CHUNK_SIZE:
+            break
+        cursor = (page[-1].official_full, page[-1].bioguide_id)
+    yield ']'
+
 
 @api_view(['GET'])
 def search_by_params(request):
@@ -21,9 +151,18 @@ def search_by_params(request):
         
     additionally supports boolean current to match only current reps
 
+    results are ordered by official_full and paginated:
+    - limit - page size, defaults to 100, at most 1000
+    - cursor - the X-Next-Cursor header of the previous page, which is only
+      set if there are more results
+    - fields - "short" for the short form of each person, or a comma separated
+      list of the fields to include
+    - export - stream all of the results instead of a page
+
     example:
         http://127.0.0.1:8000/legislators/search/?gender=F&religion=Jewish
         http://127.0.0.1:8000/legislators/search/?gender=F&religion=Jewish&current
+        http://127.0.0.1:8000/legislators/search/?fields=bioguide_id,official_full&limit=20
         
     
     :param request: 
@@ -68,8 +207,27 @@ def search_by_params(request):
         logger.info("search by religion")
         people = people.filter(religion=params.get('religion'))
 
-    serializer = CongressPersonSerializer(people, many=True)
-    return JsonResponse(serializer.data, safe=False)
+    try:
+        serializer_class, fields = get_person_serializer(params.get('fields'))
+        limit = parse_limit(params.get('limit'))
+        cursor = decode_cursor(params['cursor']) if 'cursor' in params else None
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    people = prefetch_people(people, fields or serializer_class.Meta.fields)
+
+    if 'export' in params:
+        return StreamingHttpResponse(
+            stream_people(people, serializer_class, fields),
+            content_type='application/json',
+        )
+
+    # One extra person tells us whether there's a next page.
+    page = list(page_after(people, cursor, limit + 1))
+    serializer = serializer_class(page[:limit], many=True, fields=fields)
+    response = JsonResponse(serializer.data, safe=False)
+    if len(page) > limit:
+        response[NEXT_CURSOR_HEADER] = encode_cursor(page[limit - 1])
+    return response
 
 
 def find_by_id(request, person_id):
@@ -80,7 +238,7 @@ def find_by_id(request, person_id):
     :return:  a single congress person
     """
     logger.info("Request: {}".format(person_id))
-    person = CongressPerson.objects.prefetch_related('terms').get(pk=person_id)
+    person = prefetch_people(CongressPerson.objects).get(pk=person_id)
     serializer = CongressPersonSerializer(person)
     return JsonResponse(serializer.data, safe=False)
 
@@ -94,7 +252,9 @@ def find_by_bioguide_id(request, bioguide_id):
     :return:  a single CongressPerson
     """
     logger.info("Request: {}".format(bioguide_id))
-    ref = ExternalId.objects.filter(type='bioguide', value=bioguide_id)[0]
+    ref = ExternalId.objects.select_related('person').filter(
+        type='bioguide', value=bioguide_id
+    )[0]
     serializer = CongressPersonSerializer(ref.person)
     return JsonResponse(serializer.data, safe=False)
 
@@ -102,12 +262,17 @@ def find_by_bioguide_id(request, bioguide_id):
 @api_view(['GET'])
 def list_current(request):
     """
-    Get all of the current CongressPeople
+    Get all of the current CongressPeople, served from a snapshot that is
+    rebuilt when the legislators are reloaded. Supports conditional requests
+    with If-None-Match.
     :param request: optional - state=<2 letter state code>
     :return: A list of CongressPeople
     """
-    params = request.query_params
-    state = params.get('state', None)
-    people = get_current_legislators()
-    serializer = CongressPersonSerializer(people, many=True)
-    return JsonResponse(serializer.data, safe=False)
\ No newline at end of file
+    state = request.query_params.get('state', None)
+    body, etag = get_current_legislators_json(state.upper() if state else None)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    return response
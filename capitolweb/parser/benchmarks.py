@@ -0,0 +1,268 @@
+"""Micro-benchmarks for the CREC parser. Run them with
+``./manage.py benchmark_parser``.
+"""
+
+import re
+import time
+from itertools import chain
+from zipfile import ZipFile
+
+from fuzzywuzzy import process
+from lxml import etree
+
+import parser.text_utils as text_utils
+from parser.crec_parser import APPROX_MATCH_THRESHOLD
+from parser.crec_parser import CRECParser
+from parser.crec_parser import DEFAULT_XML_NS
+from parser.crec_parser import GENERIC_SPEAKERS
+from parser.crec_parser import METADATA_FIELDS
+from parser.crec_parser import extract_metadata_fields
+
+
+DEFAULT_FIXTURE_ZIP = 'scraper/test_resources/CREC-2017-01-20.zip'
+
+
+DEFAULT_FIXTURE_MODS = 'parser/test_resources/mods.xml'
+
+
+def preprocess_reference(text):
+    """The original implementation of ``text_utils.preprocess``, one
+    ``re.sub`` pass per substitution. Kept as the baseline for benchmarks and
+    as the golden reference the current implementation must match.
+
+    Args:
+        text (str)
+
+    Returns:
+        str
+    """
+    pattern = re.compile('[A-Z!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~ ]{10,}')
+    index = re.search(pattern, text).start()
+    text = text[index:]
+    text = re.sub('E\s?X\s?T\s?E\s?N\s?S\s?I\s?O\s?N\s+O\s?F\s+R\s?E\s?M\s?A\s?R\s?K\s?S\n+', '', text)
+    text = re.sub('HON\.', 'HON', text)
+    text = re.sub('\n{2,}', '. ', text)
+    text = re.sub('_{3,}', '\n', text)
+    text = re.sub('<[^<]+?>', '', text)
+    text = re.sub('\n{3,}', '. ', text).strip()
+    text = re.sub('\n', ' ', text).strip()
+    text = re.sub(' {3,}', ' ', text).strip()
+    text = re.sub('\s{2,}', ' ', text).strip()
+    text = re.sub('\.{2,}', '.', text).strip()
+    text = re.sub('[\. \. ]{2,}', '. ', text).strip()
+    text = re.sub('[\. \.]{2,}', '. ', text).strip()
+    text = re.sub('\. of', ' of', text)
+    text = re.sub('\. in', ' in', text)
+    return text
+
+
+def extract_metadata_reference(element, xml_namespace=DEFAULT_XML_NS):
+    """The original way CRECParser read its metadata: one ``xpath()`` call,
+    with the expression parsed from scratch, per field. Kept as the baseline
+    for benchmarks and as the golden reference.
+
+    Args:
+        element (:class:`lxml.etree._Element`): A "constituent" element.
+        xml_namespace (dict)
+
+    Returns:
+        dict: Maps each name in ``METADATA_FIELDS`` to its value.
+    """
+    def xpath(tree, expr):
+        return tree.xpath(expr, namespaces=xml_namespace)
+
+    speaker_ids = {}
+    for person in xpath(element, 'ns:extension/ns:congMember'):
+        parsed_name = xpath(person, 'string(ns:name[@type="parsed"])')
+        sanitized_name = re.sub(' of .*$', '', parsed_name)
+        if person.get('role') == 'SPEAKING':
+            speaker_ids[sanitized_name] = person.get('bioGuideId')
+    return {
+        'id': xpath(element, 'string(@ID)'),
+        'title': xpath(element, 'string(ns:titleInfo/ns:title)'),
+        'title_part': xpath(element, 'string(ns:titleInfo/ns:partName)'),
+        'pdf_url': xpath(
+            element, 'string(ns:location/ns:url[@displayLabel="PDF rendition"])'
+        ),
+        'html_url': xpath(
+            element, 'string(ns:location/ns:url[@displayLabel="HTML rendition"])'
+        ),
+        'page_start': xpath(
+            element, 'string(ns:part[@type="article"]/ns:extent/ns:start)'
+        ),
+        'page_end': xpath(
+            element, 'string(ns:part[@type="article"]/ns:extent/ns:end)'
+        ),
+        'speakers': xpath(
+            element, 'ns:name[@type="personal"]/ns:namePart/text()'
+        ),
+        'speaker_ids': speaker_ids,
+    }
+
+
+def extract_metadata_by_field(element, xml_namespace=DEFAULT_XML_NS):
+    """Reads the metadata through the CRECParser properties, one compiled
+    XPath per field. Content is never fetched, so no s3 client is needed.
+    """
+    crec = CRECParser(element, None, xml_namespace, s3_client=object())
+    return {field: getattr(crec, field) for field in METADATA_FIELDS}
+
+
+def match_speaker_reference(sent, speakers):
+    """The original way CRECParser.segments found the speaker of a sentence: a
+    linear scan for the first name that occurs in it, then ``fuzzywuzzy``
+    against the whole sentence. Kept as the golden reference for
+    :class:`parser.crec_parser.SpeakerMatcher`.
+
+    Args:
+        sent (str)
+        speakers (list of str): Speaker names in priority order.
+
+    Returns:
+        str: The matching speaker, or None.
+    """
+    speaker = next(filter(lambda person: person in sent, speakers), None)
+    if speaker is not None:
+        return speaker
+    speaker, score = process.extractOne(sent, speakers)
+    if score > APPROX_MATCH_THRESHOLD:
+        return speaker
+    return None
+
+
+def segments_reference(crec):
+    """The original implementation of ``CRECParser.segments``, matching each
+    sentence with :func:`match_speaker_reference`.
+
+    Args:
+        crec (:class:`parser.crec_parser.CRECParser`)
+
+    Returns:
+        list of dict
+    """
+    sents = (sent.string for sent in crec.textacy_text.spacy_doc.sents)
+    previous = None
+    current = None
+    segment_index = 0
+    segment_sents = []
+    segments_ = []
+    speakers = list(chain(crec.speaker_ids.keys(), GENERIC_SPEAKERS))
+    for sent in chain(sents, ('<EOF>',)):
+        speaker = match_speaker_reference(sent, speakers)
+        if speaker is not None:
+            current = speaker
+        if previous != current or sent == '<EOF>':
+            if segment_sents:
+                segment_index += 1
+                segment = {
+                    'id': '{}-{}'.format(crec.id, segment_index),
+                    'speaker': previous,
+                    'text': ' '.join(segment_sents),
+                    'bioguide_id': None,
+                }
+                if segment['speaker'] in crec.speaker_ids:
+                    segment['bioguide_id'] = crec.speaker_ids[segment['speaker']]
+                segments_.append(segment)
+            previous = current
+            segment_sents = [sent]
+        else:
+            segment_sents.append(sent)
+    return segments_
+
+
+def load_fixture_constituents(mods_path=DEFAULT_FIXTURE_MODS,
+                              xml_namespace=DEFAULT_XML_NS):
+    """Parses a mods.xml file and returns its "constituent" elements.
+
+    Args:
+        mods_path (str): Path to a mods.xml file from gpo.gov.
+        xml_namespace (dict)
+
+    Returns:
+        list of :class:`lxml.etree._Element`
+    """
+    return etree.parse(mods_path).xpath(
+        '//ns:relatedItem[@type="constituent"]', namespaces=xml_namespace
+    )
+
+
+def load_fixture_html(zip_path=DEFAULT_FIXTURE_ZIP):
+    """Reads the text of every html file in a CREC zip.
+
+    Args:
+        zip_path (str): Path to a CREC zip file from gpo.gov.
+
+    Returns:
+        list of str: The decoded contents of each html file.
+    """
+    with ZipFile(zip_path) as zf:
+        return [
+            zf.read(f).decode('utf-8') for f in zf.filelist
+            if f.filename.endswith('.htm')
+        ]
+
+
+def time_calls(func, args_list, repeat):
+    """Returns the best total time, over ``repeat`` runs, of calling ``func``
+    once with each item of ``args_list``.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def benchmark_preprocess(texts, repeat=5):
+    """Times ``text_utils.preprocess`` against ``preprocess_reference``.
+
+    Args:
+        texts (list of str): CREC document contents.
+        repeat (int): Number of timed runs, the best is reported.
+
+    Returns:
+        dict: Total seconds for the reference and current implementations
+            and the speedup.
+    """
+    args_list = [(t,) for t in texts]
+    reference = time_calls(preprocess_reference, args_list, repeat)
+    current = time_calls(text_utils.preprocess, args_list, repeat)
+    return {
+        'reference': reference,
+        'current': current,
+        'speedup': reference / current,
+    }
+
+
+def benchmark_metadata(elements, repeat=5):
+    """Times reading the CRECParser metadata fields with
+    ``extract_metadata_reference`` (uncompiled XPath per field),
+    ``extract_metadata_by_field`` (compiled XPath per field) and
+    ``extract_metadata_fields`` (single pass).
+
+    Args:
+        elements (list): "constituent" elements from mods.xml.
+        repeat (int): Number of timed runs, the best is reported.
+
+    Returns:
+        dict: Total seconds for each implementation, the per document time of
+            each and the speedups relative to the reference.
+    """
+    args_list = [(e,) for e in elements]
+    reference = time_calls(extract_metadata_reference, args_list, repeat)
+    compiled = time_calls(extract_metadata_by_field, args_list, repeat)
+    single_pass = time_calls(extract_metadata_fields, args_list, repeat)
+    return {
+        'reference': reference,
+        'compiled': compiled,
+        'single_pass': single_pass,
+        'reference_per_doc': reference / len(elements),
+        'compiled_per_doc': compiled / len(elements),
+        'single_pass_per_doc': single_pass / len(elements),
+        'compiled_speedup': reference / compiled,
+        'single_pass_speedup': reference / single_pass,
+    }
@@ -1,26 +1,42 @@
 from __future__ import print_function
 
+import hashlib
 import logging
 import re
+import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from collections import Counter
 from itertools import chain
 import json
 
 import boto3
 import spacy
+import spacy.about
 import textacy
 from lxml import etree
 from fuzzywuzzy import process
+from fuzzywuzzy import utils as fuzz_utils
 from django.utils.functional import cached_property
 from django.conf import settings
+from django.db import transaction
 
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError
 from botocore.exceptions import ClientError
 
 from cwapi.models import SpeakerWordCounts
+from cwapi.models import SpeakerTermCount
+from cwapi.models import DailyTermCount
+from cwapi.models import DailyTermCountCoverage
+from cwapi.models import MAX_TERM_LENGTH
 from cwapi.es_docs import CRECDoc
+from cwapi.es_docs import count_terms
 # from cwapi.es_docs import AttributedSegmentDoc
 import parser.text_utils as text_utils
+from parser.models import ParseCacheEntry
+from parser.profiling import StageTimer
 from scraper.crec_scraper import crec_s3_key
 
 
@@ -36,6 +52,53 @@ SPACY_NLP = spacy.load('en')
 APPROX_MATCH_THRESHOLD = 90
 
 
+# Approximate speaker matches are only looked for in this many characters
+# beyond the longest speaker name at the start of each sentence.
+APPROX_MATCH_PREFIX_PADDING = 20
+
+
+DEFAULT_NLP_BATCH_SIZE = 16
+
+
+DEFAULT_NLP_N_THREADS = 2
+
+
+DEFAULT_S3_FETCH_WORKERS = 16
+
+
+SPEAKER_WORD_COUNTS_BATCH_SIZE = 500
+
+
+# Bump whenever a change to preprocessing, NLP post-processing or segmentation
+# changes parse results, to invalidate every ParseCacheEntry.
+PARSER_VERSION = '1'
+
+
+PARSE_CACHE_BATCH_SIZE = 500
+
+
+S3_FETCH_MAX_RETRIES = 3
+
+
+S3_MISSING_KEY_ERROR_CODES = ('NoSuchKey', '404')
+
+
+S3_THROTTLING_ERROR_CODES = (
+    'Throttling', 'ThrottlingException', 'SlowDown', 'RequestLimitExceeded',
+)
+
+
+def is_transient_s3_error(error):
+    """True for s3 errors worth retrying: throttling, 5xx responses and
+    connection level errors raised by botocore.
+    """
+    if isinstance(error, BotoCoreError):
+        return True
+    code = error.response.get('Error', {}).get('Code')
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return code in S3_THROTTLING_ERROR_CODES or (status or 0) >= 500
+
+
 HOUSE_GENERIC_SPEAKERS = [
     'The CLERK', 'The Acting CLERK', 'The ACTING CLERK',
     'The SPEAKER pro tempore', 'The SPEAKER'
@@ -56,19 +119,242 @@ SENATE_GENERIC_SPEAKERS = [
 GENERIC_SPEAKERS = HOUSE_GENERIC_SPEAKERS + SENATE_GENERIC_SPEAKERS
 
 
+# CRECParser fields read from the mods metadata.
+METADATA_FIELDS = (
+    'id', 'title', 'title_part', 'pdf_url', 'html_url', 'page_start',
+    'page_end', 'speakers', 'speaker_ids',
+)
+
+
+# XPath expressions for the mods metadata, relative to a constituent element
+# (or to a congMember element for "parsed_name").
+METADATA_XPATHS = {
+    'id': 'string(@ID)',
+    'title': 'string(ns:titleInfo/ns:title)',
+    'title_part': 'string(ns:titleInfo/ns:partName)',
+    'pdf_url': 'string(ns:location/ns:url[@displayLabel="PDF rendition"])',
+    'html_url': 'string(ns:location/ns:url[@displayLabel="HTML rendition"])',
+    'page_start': 'string(ns:part[@type="article"]/ns:extent/ns:start)',
+    'page_end': 'string(ns:part[@type="article"]/ns:extent/ns:end)',
+    'speakers': 'ns:name[@type="personal"]/ns:namePart/text()',
+    'cong_members': 'ns:extension/ns:congMember',
+    'parsed_name': 'string(ns:name[@type="parsed"])',
+}
+
+
+SPEAKER_STATE_PATTERN = re.compile(' of .*$')
+
+
+@lru_cache(maxsize=None)
+def compile_metadata_xpaths(namespace):
+    """Compiles ``METADATA_XPATHS`` once per mods namespace, instead of lxml
+    parsing the expression on every evaluation.
+
+    Args:
+        namespace (str): The mods namespace uri, bound to the "ns" prefix.
+
+    Returns:
+        dict: Maps each name in ``METADATA_XPATHS`` to an
+            :class:`lxml.etree.XPath`.
+    """
+    return {
+        name: etree.XPath(
+            xpath, namespaces={'ns': namespace}, smart_strings=False
+        )
+        for name, xpath in METADATA_XPATHS.items()
+    }
+
+
+def sanitize_speaker_name(parsed_name):
+    """Strips the state from a congMember's parsed name, e.g. "Mr. SMITH of
+    Texas" becomes "Mr. SMITH".
+    """
+    return SPEAKER_STATE_PATTERN.sub('', parsed_name)
+
+
+def _element_string(element):
+    """Equivalent of the XPath ``string()`` function for an element.
+    """
+    if len(element) == 0:
+        return element.text or ''
+    return ''.join(element.itertext())
+
+
+@lru_cache(maxsize=None)
+def _metadata_tags(namespace):
+    """Qualified tag names read by ``extract_metadata_fields``.
+    """
+    return {
+        name: '{{{0}}}{1}'.format(namespace, name)
+        for name in ('titleInfo', 'title', 'partName', 'location', 'url',
+                     'part', 'extent', 'start', 'end', 'name', 'namePart',
+                     'extension', 'congMember')
+    }
+
+
+def extract_metadata_fields(element, xml_namespace=DEFAULT_XML_NS):
+    """Reads every field in ``METADATA_FIELDS`` from a constituent element in a
+    single pass over its children, rather than evaluating one XPath
+    expression per field. Returns the same values as the corresponding
+    CRECParser properties.
+
+    Args:
+        element (:class:`lxml.etree._Element`): A "constituent" relatedItem
+            element from mods.xml.
+        xml_namespace (dict): The xml_namespaces argument to use with the lxml
+            parser.
+
+    Returns:
+        dict: Maps each name in ``METADATA_FIELDS`` to its value.
+    """
+    tags = _metadata_tags(xml_namespace['ns'])
+    fields = {
+        'id': element.get('ID', ''),
+        'title': None,
+        'title_part': None,
+        'pdf_url': None,
+        'html_url': None,
+        'page_start': None,
+        'page_end': None,
+        'speakers': [],
+        'speaker_ids': {},
+    }
+    for child in element:
+        tag = child.tag
+        if tag == tags['titleInfo']:
+            for sub in child:
+                if sub.tag == tags['title'] and fields['title'] is None:
+                    fields['title'] = _element_string(sub)
+                elif sub.tag == tags['partName'] and fields['title_part'] is None:
+                    fields['title_part'] = _element_string(sub)
+        elif tag == tags['location']:
+            for sub in child:
+                if sub.tag != tags['url']:
+                    continue
+                label = sub.get('displayLabel')
+                if label == 'PDF rendition' and fields['pdf_url'] is None:
+                    fields['pdf_url'] = _element_string(sub)
+                elif label == 'HTML rendition' and fields['html_url'] is None:
+                    fields['html_url'] = _element_string(sub)
+        elif tag == tags['part'] and child.get('type') == 'article':
+            for extent in child:
+                if extent.tag != tags['extent']:
+                    continue
+                for sub in extent:
+                    if sub.tag == tags['start'] and fields['page_start'] is None:
+                        fields['page_start'] = _element_string(sub)
+                    elif sub.tag == tags['end'] and fields['page_end'] is None:
+                        fields['page_end'] = _element_string(sub)
+        elif tag == tags['name'] and child.get('type') == 'personal':
+            for sub in child:
+                if sub.tag != tags['namePart']:
+                    continue
+                texts = [sub.text] + [c.tail for c in sub]
+                fields['speakers'].extend(t for t in texts if t is not None)
+        elif tag == tags['extension']:
+            for member in child:
+                if (member.tag != tags['congMember'] or
+                        member.get('role') != 'SPEAKING'):
+                    continue
+                parsed_name = next(
+                    (
+                        _element_string(name) for name in member
+                        if name.tag == tags['name'] and name.get('type') == 'parsed'
+                    ),
+                    ''
+                )
+                sanitized_name = sanitize_speaker_name(parsed_name)
+                fields['speaker_ids'][sanitized_name] = member.get('bioGuideId')
+    for field, value in fields.items():
+        if value is None:
+            fields[field] = ''
+    return fields
+
+
+class SpeakerMatcher(object):
+    """Finds the speaker introduced in a sentence of a CREC doc, built once per
+    document from its speaker names.
+
+    A single compiled pattern of every name rules out sentences without an
+    exact match in one scan, and only sentences that do contain a name are
+    checked name by name, so the first name (in the order given) that occurs
+    in the sentence wins. Approximate matching is restricted to the beginning
+    of the sentence, where speakers are introduced, and compares against names
+    normalized once up front.
+
+    Args:
+        speakers (iterable of str): Speaker names in priority order.
+    """
+
+    def __init__(self, speakers):
+        self.speakers = list(speakers)
+        self._pattern = re.compile(
+            '|'.join(re.escape(speaker) for speaker in self.speakers)
+        )
+        self._choices = {
+            speaker: fuzz_utils.full_process(speaker)
+            for speaker in self.speakers
+        }
+        self._prefix_length = (
+            max(len(speaker) for speaker in self.speakers) +
+            APPROX_MATCH_PREFIX_PADDING
+        )
+
+    def exact_match(self, sent):
+        """Returns the first speaker whose name occurs in the sentence, or
+        None.
+        """
+        if self._pattern.search(sent) is None:
+            return None
+        return next(speaker for speaker in self.speakers if speaker in sent)
+
+    def approximate_match(self, sent):
+        """Returns a tuple of the speaker whose name best matches the beginning
+        of the sentence and its score, if that score is above
+        ``APPROX_MATCH_THRESHOLD``, otherwise ``(None, None)``.
+        """
+        query = fuzz_utils.full_process(sent[:self._prefix_length])
+        if not query:
+            return None, None
+        match = process.extractOne(
+            query,
+            self._choices,
+            processor=None,
+            score_cutoff=APPROX_MATCH_THRESHOLD + 1,
+        )
+        if match is None:
+            return None, None
+        _, score, speaker = match
+        return speaker, score
+
+
 class CRECParser(object):
     
     def __init__(self, 
                  xml_tree,
                  date_issued, 
-                 xml_namespace=DEFAULT_XML_NS):
+                 xml_namespace=DEFAULT_XML_NS,
+                 s3_client=None):
         self._xml_tree = xml_tree
         self._xml_namespace = xml_namespace
+        self._xpaths = compile_metadata_xpaths(xml_namespace['ns'])
         self.date_issued = date_issued
-        self.s3 = boto3.client('s3')
+        if s3_client is None:
+            s3_client = boto3.client('s3')
+        self.s3 = s3_client
         
-    def _get_by_xpath(self, xml_tree, xpath):
-        return xml_tree.xpath(xpath, namespaces=self._xml_namespace)
+    def _get_by_xpath(self, xml_tree, name):
+        return self._xpaths[name](xml_tree)
+
+    def extract_metadata(self):
+        """Reads every field from the mods metadata up front, in a single pass,
+        and drops the reference to the xml element, so the element can be
+        freed (or cleared while streaming the rest of the mods file).
+        """
+        fields = extract_metadata_fields(self._xml_tree, self._xml_namespace)
+        for field, value in fields.items():
+            setattr(self, field, value)
+        self._xml_tree = None
 
     @cached_property                
     def id(self):
@@ -78,42 +364,32 @@ class CRECParser(object):
         Example:
             "id-CREC-2017-01-20-pt1-PgD55"
         """
-        return self._get_by_xpath(self._xml_tree, 'string(@ID)')
+        return self._get_by_xpath(self._xml_tree, 'id')
 
     @cached_property        
     def title(self):
         """Title of CREC document.
         """
-        return self._get_by_xpath(
-            self._xml_tree, 'string(ns:titleInfo/ns:title)'
-        )
+        return self._get_by_xpath(self._xml_tree, 'title')
 
     @cached_property                
     def title_part(self):
         """Section of daily batch of CREC docs, usually one of "Daily Digest",
         "Extensions of Remarks", "House", "Senate".
         """
-        return self._get_by_xpath(
-            self._xml_tree, 'string(ns:titleInfo/ns:partName)'
-        )
+        return self._get_by_xpath(self._xml_tree, 'title_part')
 
     @cached_property            
     def pdf_url(self):
         """Location on gpo.gov for the pdf version of this CREC doc.
         """
-        return self._get_by_xpath(
-            self._xml_tree, 
-            'string(ns:location/ns:url[@displayLabel="PDF rendition"])'
-        )
+        return self._get_by_xpath(self._xml_tree, 'pdf_url')
 
     @cached_property            
     def html_url(self):
         """Location on gpo.gov for the html version of this CREC doc.
         """
-        return self._get_by_xpath(
-            self._xml_tree, 
-            'string(ns:location/ns:url[@displayLabel="HTML rendition"])'
-        )
+        return self._get_by_xpath(self._xml_tree, 'html_url')
 
     @cached_property            
     def page_start(self):
@@ -121,10 +397,7 @@ class CRECParser(object):
         page on which this document starts (a single page can include more than
         one doc).
         """
-        return self._get_by_xpath(
-            self._xml_tree,
-            'string(ns:part[@type="article"]/ns:extent/ns:start)'
-        )
+        return self._get_by_xpath(self._xml_tree, 'page_start')
 
     @cached_property            
     def page_end(self):
@@ -132,10 +405,7 @@ class CRECParser(object):
         page on which this document ends (a single page can include more than
         one doc).
         """
-        return self._get_by_xpath(
-            self._xml_tree,
-            'string(ns:part[@type="article"]/ns:extent/ns:end)'
-        )
+        return self._get_by_xpath(self._xml_tree, 'page_end')
 
     @cached_property        
     def speakers(self):
@@ -148,9 +418,7 @@ class CRECParser(object):
             ``['Charles E. Schumer']``
             ``[]``
         """
-        return self._get_by_xpath(
-            self._xml_tree, 'ns:name[@type="personal"]/ns:namePart/text()'
-        )
+        return self._get_by_xpath(self._xml_tree, 'speakers')
 
     @cached_property
     def speaker_ids(self):
@@ -164,32 +432,62 @@ class CRECParser(object):
             ``{}``
         """
         speaker_ids_ = {}
-        persons = self._get_by_xpath(
-            self._xml_tree, 'ns:extension/ns:congMember'
-        )
+        persons = self._get_by_xpath(self._xml_tree, 'cong_members')
         for person in persons:
-            parsed_name = self._get_by_xpath(
-                person, 'string(ns:name[@type="parsed"])'
-            )
-            sanitized_name = re.sub(' of .*$', '', parsed_name)
+            parsed_name = self._get_by_xpath(person, 'parsed_name')
+            sanitized_name = sanitize_speaker_name(parsed_name)
             if person.get('role') == 'SPEAKING':
                 speaker_ids_[sanitized_name] = person.get('bioGuideId')
         return speaker_ids_
     
+    @cached_property
+    def s3_key(self):
+        """Location of the html file for this CREC doc in the staging bucket.
+        """
+        return crec_s3_key(self.id.strip('id-') + '.htm', self.date_issued)
+
     @cached_property
     def content(self):
-        """The text of this CREC doc (may be plain text or html).
+        """The text of this CREC doc (may be plain text or html). Populated in
+        bulk by ``prefetch_content`` when a whole day is parsed at once.
         """
-        s3_key = crec_s3_key(self.id.strip('id-') + '.htm', self.date_issued)
-        try:
-            response = self.s3.get_object(
-                Bucket=settings.CREC_STAGING_S3_BUCKET, Key=s3_key
+        return self.fetch_content()
+
+    def fetch_content(self):
+        """Retrieves the text of this CREC doc from s3, retrying transient
+        errors (see :func:`is_transient_s3_error`) with exponential backoff.
+
+        Returns:
+            str: The text of this CREC doc, or None if it is missing or cannot
+                be fetched, in which case the doc is skipped.
+        """
+        for attempt in range(S3_FETCH_MAX_RETRIES + 1):
+            try:
+                response = self.s3.get_object(
+                    Bucket=settings.CREC_STAGING_S3_BUCKET, Key=self.s3_key
+                )
+                return response['Body'].read().decode('utf-8')
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') in S3_MISSING_KEY_ERROR_CODES:
+                    logger.warning('Could not find {0}.'.format(self.s3_key))
+                    return None
+                error = e
+            except BotoCoreError as e:
+                error = e
+            if not is_transient_s3_error(error):
+                logger.error(
+                    'Error fetching {0}: {1}'.format(self.s3_key, error)
+                )
+                return None
+            logger.warning(
+                'Error fetching {0} (attempt {1}): {2}'.format(
+                    self.s3_key, attempt + 1, error
+                )
             )
-            content = response['Body'].read().decode('utf-8')
-            return content
-        except ClientError as e:
-            # TODO: Proper error handling for missing CREC file.
-            print(s3_key)
+            if attempt < S3_FETCH_MAX_RETRIES:
+                time.sleep(2 ** attempt)
+        logger.error('Giving up fetching {0}.'.format(self.s3_key))
+        return None
         
     @cached_property
     def is_daily_digest(self):
@@ -225,7 +523,8 @@ class CRECParser(object):
     @cached_property
     def textacy_text(self):
         """An instance of ``textacy.Doc`` containing preprocessed data from the
-        ``content`` field.
+        ``content`` field. Populated in bulk by ``process_crecs`` when a whole
+        day is parsed at once.
         """
         text = text_utils.preprocess(self.content)
         return textacy.Doc(SPACY_NLP(text))
@@ -327,19 +626,18 @@ class CRECParser(object):
         segment_index = 0
         segment_sents = []
         segments_ = []
-        individual_speakers = self.speaker_ids.keys()
+        speaker_matcher = SpeakerMatcher(
+            chain(self.speaker_ids.keys(), GENERIC_SPEAKERS)
+        )
         for sent in chain(sents, ('<EOF>',)):
-            speaker = next(
-                filter(lambda person: person in sent, chain(
-                    individual_speakers, GENERIC_SPEAKERS)), None)
+            speaker = speaker_matcher.exact_match(sent)
             if speaker is not None:
                 current = speaker
                 logger.debug(
                     'Found speaker: {}, previous speaker {}'.format(current, previous))
             else:
-                speaker, score = process.extractOne(sent, chain(
-                    individual_speakers, GENERIC_SPEAKERS))
-                if score > APPROX_MATCH_THRESHOLD:
+                speaker, score = speaker_matcher.approximate_match(sent)
+                if speaker is not None:
                     current = speaker
                     logger.debug(
                         'Found speaker: {} (approx. score {}/100), previous speaker: {}'.format(
@@ -367,9 +665,11 @@ class CRECParser(object):
         elasticsearch.
         
         Returns:
-            dict: A dict representation of this document.
+            dict: A dict representation of this document, keyed by the CREC
+                id so parsing a day again overwrites its docs.
         """
         return CRECDoc(
+            meta={'id': self.id},
             title=self.title,
             title_part=self.title_part,
             date_issued=self.date_issued,
@@ -392,21 +692,324 @@ def upload_speaker_word_counts(crec_parser):
         crec_parser (:class:`parser.crec_parser.CRECParser`): A CRECParser
             instance representing a single CREC document.
     """
-    if crec_parser.speaker_ids:
-        named_entities = {'named_entities_{0}'.format(ne_type): counts                    
-                          for ne_type, counts in crec_parser.named_entity_counts.items()}
-        for bioguide_id in crec_parser.speaker_ids.values():
-            speaker_counts = SpeakerWordCounts(
-                bioguide_id=bioguide_id,
-                crec_id=crec_parser.id,
-                date=crec_parser.date_issued,
-                named_entities=json.dumps(crec_parser.named_entity_counts),
-                noun_chunks=json.dumps(crec_parser.noun_chunks_counts)
+    bulk_upload_speaker_word_counts([crec_parser])
+
+
+def bulk_upload_speaker_word_counts(crecs, batch_size=SPEAKER_WORD_COUNTS_BATCH_SIZE):
+    """Creates SpeakerWordCounts and SpeakerTermCount entries for every
+    speaker of every document in a single transaction, replacing any entries
+    previously created for those documents so that re-parsing a day doesn't
+    duplicate them.
+    
+    Args:
+        crecs (list of :class:`parser.crec_parser.CRECParser`): CRECParser
+            instances, typically all of the processed documents for a day.
+        batch_size (int): Maximum number of rows written (or documents
+            cleared) per query.
+    """
+    max_term_length = SpeakerTermCount._meta.get_field('term').max_length
+    rows = []
+    term_rows = []
+    crec_ids = []
+    for crec in crecs:
+        crec_ids.append(crec.id)
+        if not crec.speaker_ids:
+            continue
+        named_entities = json.dumps(crec.named_entity_counts)
+        noun_chunks = json.dumps(crec.noun_chunks_counts)
+        terms = [
+            (term, term_type, count)
+            for term, term_type, count in iter_speaker_terms(crec)
+            if len(term) <= max_term_length
+        ]
+        # Speakers without a bioGuideId can't be attributed any counts.
+        bioguide_ids = {b for b in crec.speaker_ids.values() if b}
+        for bioguide_id in sorted(bioguide_ids):
+            rows.append(
+                SpeakerWordCounts(
+                    bioguide_id=bioguide_id,
+                    crec_id=crec.id,
+                    date=crec.date_issued,
+                    named_entities=named_entities,
+                    noun_chunks=noun_chunks,
+                )
+            )
+            term_rows.extend(
+                SpeakerTermCount(
+                    bioguide_id=bioguide_id,
+                    crec_id=crec.id,
+                    date=crec.date_issued,
+                    term=term,
+                    type=term_type,
+                    count=count,
+                )
+                for term, term_type, count in terms
             )
-            speaker_counts.save()
+    with transaction.atomic():
+        for i in range(0, len(crec_ids), batch_size):
+            SpeakerWordCounts.objects.filter(
+                crec_id__in=crec_ids[i:i + batch_size]
+            ).delete()
+            SpeakerTermCount.objects.filter(
+                crec_id__in=crec_ids[i:i + batch_size]
+            ).delete()
+        SpeakerWordCounts.objects.bulk_create(rows, batch_size=batch_size)
+        SpeakerTermCount.objects.bulk_create(term_rows, batch_size=batch_size)
+
+
+def iter_speaker_terms(crec_parser):
+    """Yields the named entities and noun chunks of a document along with
+    their SpeakerTermCount type and number of occurrences.
+
+    Args:
+        crec_parser (:class:`parser.crec_parser.CRECParser`): A CRECParser
+            instance representing a single CREC document.
+
+    Yields:
+        tuple: 3-item tuple of the term, its type and its count.
+    """
+    for ne_type, counts in crec_parser.named_entity_counts.items():
+        term_type = 'named_entities_{0}'.format(ne_type)
+        for term, count in counts.items():
+            yield term, term_type, count
+    for term, count in crec_parser.noun_chunks_counts.items():
+        yield term, 'noun_chunks', count
+
+
+def upload_daily_term_counts(date, crecs):
+    """Rolls up the term counts of all CREC documents issued on a single day
+    into DailyTermCount entries, replacing any previous rollup for that day,
+    and marks the day as covered.
+
+    Args:
+        date (:class:`datetime.date`): The day the documents were issued.
+        crecs (list of :class:`parser.crec_parser.CRECParser`): Every
+            processed CREC document issued on that day.
+    """
+    counts = Counter()
+    for crec in crecs:
+        counts.update(count_terms(crec.content))
+    with transaction.atomic():
+        DailyTermCount.objects.filter(date=date).delete()
+        DailyTermCount.objects.bulk_create(
+            (
+                DailyTermCount(date=date, term=term, count=count)
+                for term, count in counts.items()
+                if len(term) <= MAX_TERM_LENGTH
+            ),
+            batch_size=1000,
+        )
+        DailyTermCountCoverage.objects.get_or_create(date=date)
+
+
+def process_crecs(crecs,
+                  batch_size=DEFAULT_NLP_BATCH_SIZE,
+                  n_threads=DEFAULT_NLP_N_THREADS,
+                  use_parse_cache=True,
+                  timer=None):
+    """Runs the spaCy pipeline over a whole day's worth of CREC documents at
+    once using ``nlp.pipe``, rather than one ``SPACY_NLP(text)`` call per
+    document, and hands each CRECParser its pre-built ``textacy.Doc``.
+    Skippable documents and documents without content are dropped.
+
+    Documents that were parsed before (same content, speakers and parser
+    version) get their named entities, noun chunks and segments from the
+    parse cache instead, only the rest go through spaCy.
+
+    Args:
+        crecs (list of :class:`parser.crec_parser.CRECParser`): CRECParser
+            instances for a single day, as returned by
+            ``extract_crecs_from_mods``.
+        batch_size (int): Number of documents spaCy buffers per batch.
+        n_threads (int): Number of threads spaCy may use while parsing.
+        use_parse_cache (bool): Read and update the parse cache.
+        timer (:class:`parser.profiling.StageTimer`): Records the time taken
+            by each stage for each document.
+
+    Returns:
+        list of :class:`parser.crec_parser.CRECParser`: The processed,
+            non-skippable CRECParser instances, in their original order.
+    """
+    if timer is None:
+        timer = StageTimer()
+    processable = []
+    for crec in crecs:
+        if crec.is_skippable():
+            continue
+        if not crec.content:
+            logger.warning('No content found for {0}, skipping.'.format(crec.id))
+            continue
+        processable.append(crec)
+    texts = []
+    for crec in processable:
+        with timer.time('preprocess'):
+            texts.append(text_utils.preprocess(crec.content))
+    if use_parse_cache:
+        keys = [
+            parse_cache_key(crec, text) for crec, text in zip(processable, texts)
+        ]
+        with timer.time('parse_cache_read'):
+            cached = get_parse_cache_entries(keys)
+        timer.count('parse_cache_hits', len(cached))
+        logger.info('Found {0} of {1} docs in the parse cache.'.format(
+            len(cached), len(processable)
+        ))
+    else:
+        keys = [None] * len(processable)
+        cached = {}
+    to_parse = []
+    for crec, text, key in zip(processable, texts, keys):
+        entry = cached.get(key)
+        if entry is None:
+            to_parse.append((crec, text, key))
+            continue
+        crec.named_entity_counts = json.loads(entry.named_entity_counts)
+        crec.noun_chunks_counts = json.loads(entry.noun_chunks_counts)
+        crec.segments = json.loads(entry.segments)
+    spacy_docs = iter(SPACY_NLP.pipe(
+        (text for _, text, _ in to_parse),
+        batch_size=batch_size,
+        n_threads=n_threads,
+    ))
+    for crec, _, _ in to_parse:
+        # spaCy parses lazily, so each doc is timed as it is pulled from the
+        # pipe (whole batches are parsed when the first doc is pulled).
+        with timer.time('spacy'):
+            crec.textacy_text = textacy.Doc(next(spacy_docs))
+        with timer.time('named_entities'):
+            crec.named_entity_counts
+        with timer.time('noun_chunks'):
+            crec.noun_chunks_counts
+        with timer.time('segments'):
+            crec.segments
+    if use_parse_cache and to_parse:
+        with timer.time('parse_cache_write'):
+            save_parse_cache_entries([(key, crec) for crec, _, key in to_parse])
+    return processable
+
+
+def parse_cache_key(crec_parser, preprocessed_content):
+    """Hash of everything the NLP results for a CREC document depend on: its
+    preprocessed content, its id and speakers (used for segments), and the
+    versions of the parser and spaCy model.
+
+    Args:
+        crec_parser (:class:`parser.crec_parser.CRECParser`): A CRECParser
+            instance representing a single CREC document.
+        preprocessed_content (str): The document's content, as returned by
+            ``text_utils.preprocess``.
+
+    Returns:
+        str: A sha256 hex digest.
+    """
+    model_version = getattr(SPACY_NLP, 'meta', {}).get('version', '')
+    key = hashlib.sha256()
+    for part in (PARSER_VERSION, spacy.about.__version__, model_version,
+                 crec_parser.id, json.dumps(crec_parser.speaker_ids, sort_keys=True),
+                 preprocessed_content):
+        key.update(part.encode('utf-8'))
+        key.update(b'\x00')
+    return key.hexdigest()
 
 
-def extract_crecs_from_mods(mods_file_obj, xml_namespace=DEFAULT_XML_NS):
+def get_parse_cache_entries(keys):
+    """Looks up ParseCacheEntry instances in batches.
+
+    Args:
+        keys (list of str): Parse cache keys.
+
+    Returns:
+        dict: Maps the keys that were found to their ParseCacheEntry.
+    """
+    entries = {}
+    for i in range(0, len(keys), PARSE_CACHE_BATCH_SIZE):
+        entries.update(
+            ParseCacheEntry.objects.in_bulk(keys[i:i + PARSE_CACHE_BATCH_SIZE])
+        )
+    return entries
+
+
+def save_parse_cache_entries(parsed):
+    """Stores the NLP results of freshly parsed documents.
+
+    Args:
+        parsed (list of tuple): 2-item tuples of a parse cache key and the
+            processed CRECParser instance.
+    """
+    entries = [
+        ParseCacheEntry(
+            key=key,
+            crec_id=crec.id,
+            named_entity_counts=json.dumps(crec.named_entity_counts),
+            noun_chunks_counts=json.dumps(crec.noun_chunks_counts),
+            segments=json.dumps(crec.segments),
+        )
+        for key, crec in parsed
+    ]
+    keys = [entry.key for entry in entries]
+    with transaction.atomic():
+        for i in range(0, len(keys), PARSE_CACHE_BATCH_SIZE):
+            ParseCacheEntry.objects.filter(
+                key__in=keys[i:i + PARSE_CACHE_BATCH_SIZE]
+            ).delete()
+        ParseCacheEntry.objects.bulk_create(
+            entries, batch_size=PARSE_CACHE_BATCH_SIZE
+        )
+
+
+def make_s3_client(max_pool_connections=DEFAULT_S3_FETCH_WORKERS):
+    """Returns an s3 client with a connection pool large enough to be shared
+    by every CRECParser for a day (boto3 clients are thread safe).
+    """
+    return boto3.client(
+        's3', config=Config(max_pool_connections=max_pool_connections)
+    )
+
+
+def prefetch_content(crecs, max_workers=DEFAULT_S3_FETCH_WORKERS, timer=None):
+    """Fetches the html content of every non-skippable CRECParser for a day
+    from s3 concurrently on a bounded thread pool, rather than one
+    sequential request per document as ``content`` is first accessed.
+
+    Args:
+        crecs (iterable of :class:`parser.crec_parser.CRECParser`):
+            CRECParser instances for a single day, as returned by
+            ``extract_crecs_from_mods``. If this is an iterator, such as the
+            one returned by ``iter_crecs_from_mods``, each document is fetched
+            as soon as it is extracted.
+        max_workers (int): Maximum number of concurrent s3 requests.
+        timer (:class:`parser.profiling.StageTimer`): Records the time taken
+            by each fetch ("fetch") and the number of bytes fetched.
+
+    Returns:
+        list of :class:`parser.crec_parser.CRECParser`: All of the CRECParser
+            instances, in their original order.
+    """
+    if timer is None:
+        timer = StageTimer()
+
+    def fetch(crec):
+        with timer.time('fetch'):
+            content = crec.fetch_content()
+        if content is not None:
+            timer.count('bytes', len(content.encode('utf-8')))
+        return content
+
+    all_crecs = []
+    fetches = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for crec in crecs:
+            all_crecs.append(crec)
+            if not crec.is_skippable() and 'content' not in crec.__dict__:
+                fetches.append((crec, executor.submit(fetch, crec)))
+        for crec, future in fetches:
+            crec.content = future.result()
+    return all_crecs
+
+
+def extract_crecs_from_mods(mods_file_obj,
+                            xml_namespace=DEFAULT_XML_NS,
+                            s3_client=None):
     """Takes a file-like object containing mods.xml data for a single day,
     extracts each "constituent" (a single CREC document from that day) and 
     creates a new CRECParser instance for that document. Returns all CRECParser
@@ -417,6 +1020,9 @@ def extract_crecs_from_mods(mods_file_obj, xml_namespace=DEFAULT_XML_NS):
             containing mods.xml data.
         xml_namespace (dict): The xml_namespaces argument to use with the lxml
             parser.
+        s3_client (:class:`botocore.client.S3`): Client shared by all of the
+            CRECParser instances for fetching content, one is created if not
+            provided.
     
     Returns:
         list of :class:`parser.crec_parser.CRECParser`: A list of parsed CREC
@@ -433,4 +1039,69 @@ def extract_crecs_from_mods(mods_file_obj, xml_namespace=DEFAULT_XML_NS):
         namespaces=xml_namespace,
     )
     date_issued = datetime.strptime(date_issued_str, '%Y-%m-%d')
-    return [CRECParser(c, date_issued) for c in constituents]
+    if s3_client is None:
+        s3_client = make_s3_client()
+    return [
+        CRECParser(c, date_issued, xml_namespace, s3_client=s3_client)
+        for c in constituents
+    ]
+
+
+def iter_crecs_from_mods(mods_file_obj,
+                         xml_namespace=DEFAULT_XML_NS,
+                         s3_client=None):
+    """Streaming version of ``extract_crecs_from_mods``: reads mods.xml data
+    incrementally and yields a CRECParser for each "constituent" as soon as it
+    has been read. The metadata of each document is extracted immediately and
+    its xml element cleared, so memory use doesn't grow with the size of the
+    mods file.
+
+    Args:
+        mods_file_obj (file): An open file, StringIO or BytesIO buffer
+            containing mods.xml data.
+        xml_namespace (dict): The xml_namespaces argument to use with the lxml
+            parser.
+        s3_client (:class:`botocore.client.S3`): Client shared by all of the
+            CRECParser instances for fetching content, one is created if not
+            provided.
+
+    Yields:
+        :class:`parser.crec_parser.CRECParser`: A parsed CREC doc.
+    """
+    ns = '{{{0}}}'.format(xml_namespace['ns'])
+    if s3_client is None:
+        s3_client = make_s3_client()
+    date_issued = None
+    # Docs read before the issue date (which normally comes first).
+    pending = []
+    elements = etree.iterparse(
+        mods_file_obj,
+        events=('end',),
+        tag=(ns + 'dateIssued', ns + 'relatedItem'),
+    )
+    for _, element in elements:
+        if element.tag == ns + 'dateIssued':
+            if (date_issued is None and
+                    element.getparent().tag == ns + 'originInfo'):
+                date_issued = datetime.strptime(element.text or '', '%Y-%m-%d')
+                for crec in pending:
+                    crec.date_issued = date_issued
+                    yield crec
+                pending = []
+            continue
+        if element.get('type') != 'constituent':
+            # Nested in a constituent, cleared along with it.
+            continue
+        crec = CRECParser(
+            element, date_issued, xml_namespace, s3_client=s3_client
+        )
+        crec.extract_metadata()
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+        if date_issued is None:
+            pending.append(crec)
+        else:
+            yield crec
+    if pending:
+        raise ValueError('No dateIssued found in mods file.')
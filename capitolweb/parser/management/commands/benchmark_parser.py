@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+
+import parser.text_utils as text_utils
+from parser.benchmarks import DEFAULT_FIXTURE_ZIP
+from parser.benchmarks import DEFAULT_FIXTURE_MODS
+from parser.benchmarks import benchmark_preprocess
+from parser.benchmarks import benchmark_metadata
+from parser.benchmarks import extract_metadata_by_field
+from parser.benchmarks import extract_metadata_reference
+from parser.benchmarks import load_fixture_constituents
+from parser.benchmarks import load_fixture_html
+from parser.benchmarks import preprocess_reference
+from parser.crec_parser import extract_metadata_fields
+
+
+class Command(BaseCommand):
+    help = 'Runs micro-benchmarks for the CREC parser against test fixtures.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--zip_path',
+            help='CREC zip containing html files to preprocess.',
+            default=DEFAULT_FIXTURE_ZIP,
+        )
+        parser.add_argument(
+            '--mods_path',
+            help='mods.xml file to read CREC metadata from.',
+            default=DEFAULT_FIXTURE_MODS,
+        )
+        parser.add_argument(
+            '--repeat',
+            help='Number of timed runs per benchmark, the best is reported.',
+            type=int,
+            default=5,
+        )
+
+    def handle(self, *args, **options):
+        texts = [
+            t for t in load_fixture_html(options['zip_path'])
+            if text_utils.HEADER_PATTERN.search(t)
+        ]
+        for text in texts:
+            if text_utils.preprocess(text) != preprocess_reference(text):
+                raise CommandError('preprocess output differs from reference.')
+        results = benchmark_preprocess(texts, repeat=options['repeat'])
+        self.stdout.write(
+            'preprocess ({0} docs): reference {1:.4f}s, current {2:.4f}s, '
+            '{3:.1f}x speedup'.format(
+                len(texts),
+                results['reference'],
+                results['current'],
+                results['speedup'],
+            )
+        )
+
+        elements = load_fixture_constituents(options['mods_path'])
+        for element in elements:
+            expected = extract_metadata_reference(element)
+            if (extract_metadata_by_field(element) != expected or
+                    extract_metadata_fields(element) != expected):
+                raise CommandError('metadata differs from reference.')
+        results = benchmark_metadata(elements, repeat=options['repeat'])
+        self.stdout.write(
+            'metadata ({0} docs): reference {1:.1f}us/doc, compiled xpath '
+            '{2:.1f}us/doc ({3:.1f}x speedup), single pass {4:.1f}us/doc '
+            '({5:.1f}x speedup)'.format(
+                len(elements),
+                results['reference_per_doc'] * 1e6,
+                results['compiled_per_doc'] * 1e6,
+                results['compiled_speedup'],
+                results['single_pass_per_doc'] * 1e6,
+                results['single_pass_speedup'],
+            )
+        )
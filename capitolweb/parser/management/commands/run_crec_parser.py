@@ -1,28 +1,202 @@
 import os
 import sys
 import json
+import cProfile
 import logging
 import argparse
+import signal
+import multiprocessing
 import urllib.parse as urlparse
 from datetime import datetime
 from datetime import timedelta
+from functools import partial
 
 import elasticsearch
 import botocore
 import boto3
+from django import db
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from elasticsearch_dsl.connections import connections
 
-from parser.crec_parser import extract_crecs_from_mods
-from parser.crec_parser import upload_speaker_word_counts
+from parser.crec_parser import iter_crecs_from_mods
+from parser.crec_parser import process_crecs
+from parser.crec_parser import prefetch_content
+from parser.crec_parser import make_s3_client
+from parser.crec_parser import DEFAULT_S3_FETCH_WORKERS
+from parser.crec_parser import DEFAULT_NLP_BATCH_SIZE
+from parser.crec_parser import DEFAULT_NLP_N_THREADS
+from parser.crec_parser import bulk_upload_speaker_word_counts
+from parser.crec_parser import upload_daily_term_counts
+from parser.models import CRECParserResult
+from parser.profiling import StageTimer
 from scraper.crec_scraper import crec_s3_key
 from cwapi.es_docs import CRECDoc
+from cwapi.es_docs import bulk_index_docs
+from cwapi.es_docs import bulk_indexing_settings
+from cwapi.es_docs import DEFAULT_BULK_CHUNK_SIZE
+from cwapi.es_docs import DEFAULT_BULK_MAX_CHUNK_BYTES
+from cwapi.cache import invalidate_term_counts_cache
 
 
 logger = logging.getLogger(__name__)
 
 
+PARSE_OPTIONS = (
+    'to_stdout', 'es_url', 'source_bucket', 'batch_size', 'n_threads',
+    'bulk_chunk_size', 'bulk_max_chunk_bytes', 's3_workers', 'no_parse_cache',
+    'profile',
+)
+
+
+MAX_REPORTED_INDEXING_ERRORS = 20
+
+
+MISSING_KEY_ERROR_CODES = ('NoSuchKey', '404')
+
+
+def init_worker(parse_options):
+    """Initializer for parser worker processes. Interrupts are left to the
+    parent process, which terminates the pool.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if not parse_options['to_stdout']:
+        connections.create_connection(
+            hosts=[parse_options['es_url']], timeout=20
+        )
+
+
+def parse_crecs_for_date(dt, parse_options):
+    """Parses all CREC documents staged in s3 for a single day, uploading them
+    to elasticsearch and the django configured db. If the "profile" option is
+    set, the run is profiled with cProfile and the stats are dumped to that
+    path suffixed with the date.
+
+    Args:
+        dt (:class:`datetime.datetime`): The date to parse docs for.
+        parse_options (dict): Subset of the command line options, see
+            ``PARSE_OPTIONS``.
+
+    Returns:
+        :class:`parser.models.CRECParserResult`: An unsaved ORM model instance
+            summarizing the results for this date, including timings for each
+            stage of parsing.
+    """
+    timer = StageTimer()
+    if parse_options['profile']:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(_parse_crecs_for_date, dt, parse_options, timer)
+        profiler.dump_stats(
+            '{0}.{1}'.format(parse_options['profile'], dt.strftime('%Y-%m-%d'))
+        )
+    else:
+        result = _parse_crecs_for_date(dt, parse_options, timer)
+    stats = timer.summary()
+    result.stats = json.dumps(stats)
+    logger.info(
+        'Parsed {0} in {1:.1f}s ({2:.1f} docs/s).'.format(
+            dt.strftime('%Y-%m-%d'), stats['elapsed'], stats['docs_per_sec']
+        )
+    )
+    return result
+
+
+def _parse_crecs_for_date(dt, parse_options, timer):
+    mods_s3_key = crec_s3_key('mods.xml', dt)
+    result = CRECParserResult(
+        date=dt,
+        success=False,
+        message='',
+        crec_s3_key=mods_s3_key,
+    )
+    logger.info('Processing files for {0}.'.format(dt))
+    try:
+        s3 = boto3.resource('s3')
+        try:
+            response = s3.Object(parse_options['source_bucket'], mods_s3_key).get()
+        except botocore.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in MISSING_KEY_ERROR_CODES:
+                # Anything else (permissions, throttling, s3 errors) says
+                # nothing about whether docs were issued, so leave the rollup
+                # alone.
+                result.message = 'Error fetching mods file for {0}.'.format(
+                    dt.strftime('%Y-%m-%d')
+                )
+                logger.exception(result.message)
+                return result
+            logger.info('Could not find mods file for {0}.'.format(dt))
+            if not parse_options['to_stdout']:
+                # No docs were issued that day (yet), a later run replaces
+                # the empty rollup once they are.
+                upload_daily_term_counts(dt, [])
+            result.success = True
+            result.message = 'No mods file found.'
+            return result
+        # Content is fetched while the rest of the mods file is still being
+        # read.
+        with timer.time('extract_and_fetch'):
+            crecs = prefetch_content(
+                iter_crecs_from_mods(
+                    response['Body'],
+                    s3_client=make_s3_client(parse_options['s3_workers']),
+                ),
+                max_workers=parse_options['s3_workers'],
+                timer=timer,
+            )
+        logger.info('Found {0} new records.'.format(len(crecs)))
+        if parse_options['to_stdout']:
+            logger.info('Using stdout:')
+        crecs = process_crecs(
+            crecs,
+            batch_size=parse_options['batch_size'],
+            n_threads=parse_options['n_threads'],
+            use_parse_cache=not parse_options['no_parse_cache'],
+            timer=timer,
+        )
+        timer.count('docs', len(crecs))
+        es_docs = []
+        with timer.time('es_docs'):
+            for crec in crecs:
+                if parse_options['to_stdout']:
+                    logger.info(crec.to_es_doc())
+                else:
+                    es_docs.append(crec.to_es_doc())
+        with timer.time('speaker_word_counts'):
+            bulk_upload_speaker_word_counts(crecs)
+        errors = []
+        num_indexed = 0
+        if es_docs:
+            with timer.time('es_index'):
+                num_indexed, errors = bulk_index_docs(
+                    connections.get_connection(),
+                    es_docs,
+                    chunk_size=parse_options['bulk_chunk_size'],
+                    max_chunk_bytes=parse_options['bulk_max_chunk_bytes'],
+                )
+        if not parse_options['to_stdout'] and not errors:
+            with timer.time('daily_term_counts'):
+                upload_daily_term_counts(dt, crecs)
+        if num_indexed:
+            invalidate_term_counts_cache()
+        result.success = not errors
+        result.message = 'Parsed {0} records.'.format(len(crecs))
+        if errors:
+            result.message += ' Failed to index {0} records:\n{1}'.format(
+                len(errors),
+                '\n'.join(
+                    json.dumps(e, default=str)
+                    for e in errors[:MAX_REPORTED_INDEXING_ERRORS]
+                ),
+            )
+            logger.error(result.message)
+    except Exception as e:
+        result.message = 'Error processing data for {0}.'.format(
+            dt.strftime('%Y-%m-%d')
+        )
+        logger.exception(result.message)
+    return result
+
+
 class Command(BaseCommand):
     help = 'Runs the CREC parser.'
 
@@ -54,37 +228,114 @@ class Command(BaseCommand):
             help='Location of crec data.',
             default=settings.CREC_STAGING_S3_BUCKET,
         )
+        parser.add_argument(
+            '--workers',
+            help='Number of processes to parse dates with in parallel.',
+            type=int,
+            default=1,
+        )
+        parser.add_argument(
+            '--s3_workers',
+            help='Number of concurrent requests used to fetch CREC docs from s3.',
+            type=int,
+            default=DEFAULT_S3_FETCH_WORKERS,
+        )
+        parser.add_argument(
+            '--bulk_chunk_size',
+            help='Maximum number of docs per elasticsearch bulk request.',
+            type=int,
+            default=DEFAULT_BULK_CHUNK_SIZE,
+        )
+        parser.add_argument(
+            '--bulk_max_chunk_bytes',
+            help='Maximum size in bytes of an elasticsearch bulk request.',
+            type=int,
+            default=DEFAULT_BULK_MAX_CHUNK_BYTES,
+        )
+        parser.add_argument(
+            '--disable_refresh',
+            help='Disable index refreshes and replicas while parsing, for '
+                 'large backfills. Previous settings are restored afterwards.',
+            action='store_true',
+            default=False,
+        )
+        parser.add_argument(
+            '--batch_size',
+            help='Number of documents to pass through spaCy per batch.',
+            type=int,
+            default=DEFAULT_NLP_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--n_threads',
+            help='Number of threads spaCy may use while parsing.',
+            type=int,
+            default=DEFAULT_NLP_N_THREADS,
+        )
+        parser.add_argument(
+            '--profile',
+            help='Profile parsing with cProfile and dump the stats for each '
+                 'date to this path, suffixed with the date.',
+            default=None,
+        )
+        parser.add_argument(
+            '--no_parse_cache',
+            help='Re-run NLP on every doc instead of reusing the results for '
+                 'docs that have not changed since they were last parsed.',
+            action='store_true',
+            default=False,
+        )
 
     def handle(self, *args, **options):
-        s3 = boto3.resource('s3')
-        dt = options['start_date'].replace(hour=0, minute=0, second=0, microsecond=0)
+        start_date = options['start_date'].replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        dates = []
+        dt = start_date
+        while dt < options['end_date']:
+            dates.append(dt)
+            dt += timedelta(days=1)
         if not options['to_stdout']:
             connections.create_connection(hosts=[options['es_url']], timeout=20)
             CRECDoc.init()
-        while dt < options['end_date']:
-            logger.info('Processing files for {0}.'.format(dt))
-            try:
-                response = s3.Object(
-                    options['source_bucket'],
-                    crec_s3_key('mods.xml', dt)
-                ).get()
-            except botocore.exceptions.ClientError as e:
-                logger.info('Could not find mods file for {0}.'.format(dt))
-                response = None
-            if response is not None and response.get('Body'):
-                try:
-                    crecs = extract_crecs_from_mods(response['Body'])
-                    logger.info('Found {0} new records.'.format(len(crecs)))
-                    if options['to_stdout']:
-                        logger.info('Using stdout:')
-                    for crec in crecs:
-                        if not crec.is_skippable():
-                            if options['to_stdout']:
-                                logger.info(crec.to_es_doc())
-                            else:
-                                es_doc = crec.to_es_doc()
-                                es_doc.save()
-                            upload_speaker_word_counts(crec)
-                except Exception as e:
-                    logger.exception('Error processing data for {0}.'.format(dt.strftime('%Y-%m-%d')))
-            dt += timedelta(days=1)
+        parse_options = {k: options[k] for k in PARSE_OPTIONS}
+        if options['disable_refresh'] and not options['to_stdout']:
+            with bulk_indexing_settings(
+                    connections.get_connection(), CRECDoc._doc_type.index):
+                self.parse(dates, parse_options, options['workers'])
+        else:
+            self.parse(dates, parse_options, options['workers'])
+
+    def parse(self, dates, parse_options, workers):
+        if workers > 1:
+            self.parse_in_pool(dates, parse_options, workers)
+        else:
+            for dt in dates:
+                parse_crecs_for_date(dt, parse_options).save()
+
+    def parse_in_pool(self, dates, parse_options, workers):
+        """Fans dates out to a pool of worker processes and saves the
+        CRECParserResult for each date as it completes, in date order. The
+        workers are forked from this process, so they share the spaCy model it
+        loaded when it imported the parser module rather than loading their
+        own.
+        """
+        # Child processes must open their own database connections.
+        db.connections.close_all()
+        pool = multiprocessing.Pool(
+            workers,
+            initializer=init_worker,
+            initargs=(parse_options,),
+        )
+        try:
+            for result in pool.imap(
+                    partial(parse_crecs_for_date, parse_options=parse_options),
+                    dates):
+                result.save()
+        except KeyboardInterrupt:
+            logger.warning('Interrupted, terminating parser workers.')
+            raise CommandError('Interrupted.')
+        finally:
+            # All dates are accounted for (or we're bailing out), so there
+            # is nothing left for the workers to finish.
+            pool.terminate()
+            pool.join()
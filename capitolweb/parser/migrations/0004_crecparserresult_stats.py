@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parser', '0003_parsecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crecparserresult',
+            name='stats',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
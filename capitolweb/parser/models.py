@@ -17,3 +17,23 @@ class CRECParserResult(models.Model):
     success = models.BooleanField()
     message = models.TextField()
     crec_s3_key = models.CharField(max_length=200)
+    # JSON summary of parser.profiling.StageTimer timings for this date.
+    stats = models.TextField(blank=True, default='')
+
+
+class ParseCacheEntry(models.Model):
+    """The NLP results for a CREC document, keyed by a hash of its
+    preprocessed content and everything else the results depend on (see
+    ``parser.crec_parser.parse_cache_key``), so documents that haven't
+    changed aren't re-parsed when a date is parsed again.
+    """
+
+    def __str__(self):
+        return '{0} ({1})'.format(self.crec_id, self.key)
+
+    key = models.CharField(max_length=64, primary_key=True)
+    crec_id = models.CharField(max_length=64)
+    named_entity_counts = models.TextField()
+    noun_chunks_counts = models.TextField()
+    segments = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,94 @@
+import math
+import threading
+import time
+from collections import Counter
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list.
+
+    Args:
+        sorted_values (list of float): Values in ascending order.
+        pct (float): Percentile, between 0 and 100.
+
+    Returns:
+        float: The value at that percentile, or None if there are no values.
+    """
+    if not sorted_values:
+        return None
+    rank = max(int(math.ceil(pct / 100.0 * len(sorted_values))), 1)
+    return sorted_values[rank - 1]
+
+
+class StageTimer(object):
+    """Collects wall clock timings for the stages of parsing a date's worth of
+    CREC documents (s3 fetches, preprocessing, spaCy, etc.), along with
+    counters such as the number of docs and bytes processed. Safe to use from
+    multiple threads.
+
+    Example:
+
+        ::
+
+            timer = StageTimer()
+            with timer.time('preprocess'):
+                text = preprocess(content)
+            timer.count('bytes', len(content))
+            timer.summary()
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = defaultdict(list)
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage):
+        """Context manager that records how long its body took under
+        ``stage``.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.timings[stage].append(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def summary(self):
+        """Aggregates everything recorded so far.
+
+        Returns:
+            dict: The total elapsed seconds, the counters, docs and bytes per
+                second (from the "docs" and "bytes" counters) and, for each
+                stage, the number of timings and their total, p50 and p95 in
+                seconds.
+        """
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            timings = {stage: sorted(t) for stage, t in self.timings.items()}
+            counters = dict(self.counters)
+        return {
+            'elapsed': elapsed,
+            'counters': counters,
+            'docs_per_sec': counters.get('docs', 0) / elapsed if elapsed else None,
+            'bytes_per_sec': counters.get('bytes', 0) / elapsed if elapsed else None,
+            'stages': {
+                stage: {
+                    'count': len(t),
+                    'total': sum(t),
+                    'p50': percentile(t, 50),
+                    'p95': percentile(t, 95),
+                }
+                for stage, t in timings.items()
+            },
+        }
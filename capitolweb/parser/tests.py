@@ -1,22 +1,294 @@
+import random
+import re
 from datetime import datetime
+from itertools import chain
+from unittest import mock
 
 from lxml import etree
 from django.test import TestCase
 from django.test import override_settings
 from django.conf import settings
+from django.db import OperationalError
 
 import requests_mock
 import requests
 import boto3
+import botocore
 from moto import mock_s3
 
 from cwapi.models import SpeakerWordCounts
+from cwapi.models import SpeakerTermCount
+from cwapi.models import DailyTermCount
+from cwapi.models import DailyTermCountCoverage
+from cwapi.models import MAX_TERM_LENGTH
+from cwapi.es_docs import count_terms
 from parser.crec_parser import CRECParser
+from parser.crec_parser import GENERIC_SPEAKERS
+from parser.crec_parser import SpeakerMatcher
 from parser.crec_parser import extract_crecs_from_mods
+from parser.crec_parser import iter_crecs_from_mods
+from parser.crec_parser import METADATA_FIELDS
+from parser.crec_parser import process_crecs
+from parser.crec_parser import S3_FETCH_MAX_RETRIES
+from parser.models import ParseCacheEntry
+from parser.profiling import StageTimer
+from parser.profiling import percentile
+from parser.crec_parser import prefetch_content
 from parser.crec_parser import upload_speaker_word_counts
+from parser.crec_parser import bulk_upload_speaker_word_counts
+from parser.crec_parser import upload_daily_term_counts
+from parser.benchmarks import load_fixture_html
+from parser.benchmarks import preprocess_reference
+from parser.benchmarks import extract_metadata_reference
+from parser.benchmarks import match_speaker_reference
+from parser.benchmarks import segments_reference
+from parser.benchmarks import load_fixture_constituents
+from parser.crec_parser import extract_metadata_fields
+from parser import text_utils
+from parser.management.commands import run_crec_parser
 from scraper.crec_scraper import CRECScraper
 
 
+class PreprocessTestCase(TestCase):
+
+    FRAGMENTS = [
+        '\n', '\n\n', '\n\n\n', '_', '___', ' ', '   ', '\t', '\xa0', '.',
+        '..', '. ', '<', '>', '<pre>', '</pre>', 'HON.', 'of', 'in', '. of',
+        '. in', 'E X T E N S I O N  O F  R E M A R K S\n',
+        'EXTENSION OF REMARKS\n\n', 'Mr. SMITH', 'a', 'THE SENATE MET ',
+    ]
+
+    def test_fixtures_match_reference(self):
+        texts = load_fixture_html()
+        self.assertTrue(len(texts) > 0)
+        for text in texts:
+            if text_utils.HEADER_PATTERN.search(text):
+                self.assertEqual(
+                    preprocess_reference(text), text_utils.preprocess(text)
+                )
+
+    def test_edge_cases_match_reference(self):
+        rand = random.Random(0)
+        for _ in range(5000):
+            text = 'CONGRESSIONAL RECORD ' + ''.join(
+                rand.choice(self.FRAGMENTS) for _ in range(rand.randint(0, 40))
+            )
+            self.assertEqual(
+                preprocess_reference(text), text_utils.preprocess(text)
+            )
+
+
+class SpeakerMatcherTestCase(TestCase):
+
+    def setUp(self):
+        self.speakers = ['Mr. ROBERTS', 'Mr. ROBERT'] + GENERIC_SPEAKERS
+        self.matcher = SpeakerMatcher(self.speakers)
+
+    def test_exact_match_priority(self):
+        self.assertEqual(
+            'Mr. ROBERTS',
+            self.matcher.exact_match('Mr. ROBERT and Mr. ROBERTS spoke.'),
+        )
+        self.assertEqual(
+            'The PRESIDING OFFICER',
+            self.matcher.exact_match('The PRESIDING OFFICER. Without objection.'),
+        )
+        self.assertIsNone(self.matcher.exact_match('Nothing to see here.'))
+
+    def test_exact_match_agrees_with_scan(self):
+        sents = [
+            'Mr. ROBERTS. I yield.',
+            'The SPEAKER pro tempore. The gentleman is recognized.',
+            'I thank the Chair and Mr. ROBERT.',
+            'The ACTING PRESIDENT pro tempore and the PRESIDING OFFICER.',
+            'No speakers here.',
+        ]
+        for sent in sents:
+            self.assertEqual(
+                next(filter(lambda s: s in sent, self.speakers), None),
+                self.matcher.exact_match(sent),
+            )
+
+    def test_approximate_match(self):
+        speaker, score = self.matcher.approximate_match('Mr ROBERTS.')
+        self.assertEqual('Mr. ROBERTS', speaker)
+        self.assertTrue(score > 90)
+        self.assertEqual(
+            (None, None), self.matcher.approximate_match('Nothing to see here.')
+        )
+        self.assertEqual((None, None), self.matcher.approximate_match('...'))
+
+
+class StageTimerTestCase(TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(95, percentile(values, 95))
+        self.assertEqual(1, percentile(values, 0))
+        self.assertEqual(7, percentile([7], 95))
+        self.assertIsNone(percentile([], 50))
+
+    def test_summary(self):
+        timer = StageTimer()
+        for seconds in (0.1, 0.2, 0.3):
+            timer.record('spacy', seconds)
+        with timer.time('preprocess'):
+            pass
+        timer.count('docs', 3)
+        timer.count('bytes', 1024)
+        summary = timer.summary()
+        self.assertEqual({'docs': 3, 'bytes': 1024}, summary['counters'])
+        self.assertEqual(3, summary['stages']['spacy']['count'])
+        self.assertAlmostEqual(0.6, summary['stages']['spacy']['total'])
+        self.assertEqual(0.2, summary['stages']['spacy']['p50'])
+        self.assertEqual(0.3, summary['stages']['spacy']['p95'])
+        self.assertEqual(1, summary['stages']['preprocess']['count'])
+        self.assertTrue(summary['docs_per_sec'] > 0)
+
+
+class ParseCrecsForDateTestCase(TestCase):
+
+    PARSE_OPTIONS = {
+        'to_stdout': False, 'es_url': None, 'source_bucket': 'my-test-bukkit',
+        'batch_size': 4, 'n_threads': 1, 'bulk_chunk_size': 100,
+        'bulk_max_chunk_bytes': 1024 * 1024, 's3_workers': 1,
+        'no_parse_cache': False, 'profile': None,
+    }
+
+    def parse_with_s3_error(self, code, upload_error=None):
+        error = botocore.exceptions.ClientError(
+            {'Error': {'Code': code, 'Message': code}}, 'GetObject'
+        )
+        with mock.patch.object(run_crec_parser, 'boto3') as boto3_mock, \
+                mock.patch.object(
+                    run_crec_parser, 'upload_daily_term_counts',
+                    side_effect=upload_error) as upload:
+            boto3_mock.resource.return_value.Object.return_value.get.side_effect = error
+            result = run_crec_parser.parse_crecs_for_date(
+                datetime(2017, 1, 20), self.PARSE_OPTIONS
+            )
+        return result, upload
+
+    def test_missing_mods_file(self):
+        for code in ('NoSuchKey', '404'):
+            result, upload = self.parse_with_s3_error(code)
+            self.assertTrue(result.success)
+            upload.assert_called_once_with(datetime(2017, 1, 20), [])
+
+    def test_missing_mods_file_upload_error(self):
+        result, upload = self.parse_with_s3_error(
+            'NoSuchKey', upload_error=OperationalError('database is locked')
+        )
+        self.assertFalse(result.success)
+        self.assertIn('Error processing data', result.message)
+        upload.assert_called_once_with(datetime(2017, 1, 20), [])
+
+    def test_s3_error(self):
+        for code in ('AccessDenied', 'SlowDown', 'InternalError'):
+            result, upload = self.parse_with_s3_error(code)
+            self.assertFalse(result.success)
+            self.assertIn('Error fetching mods file', result.message)
+            upload.assert_not_called()
+
+
+class DailyTermCountsTestCase(TestCase):
+
+    def test_term_length(self):
+        date = datetime(2017, 1, 20)
+        kept = 'x' * MAX_TERM_LENGTH
+        dropped = 'y' * (MAX_TERM_LENGTH + 1)
+        crec = mock.Mock(content=' '.join(['foo', kept, kept, dropped]))
+        upload_daily_term_counts(date, [crec])
+        self.assertEqual(
+            {'foo': 1, kept: 2},
+            dict(
+                DailyTermCount.objects.filter(date=date)
+                .values_list('term', 'count')
+            ),
+        )
+
+
+class SpeakerWordCountsTestCase(TestCase):
+
+    def test_speaker_without_bioguide_id(self):
+        crec = mock.Mock(
+            id='id-CREC-2017-01-20-pt1-PgS348',
+            date_issued=datetime(2017, 1, 20),
+            speaker_ids={'Mr. McCONNELL': 'M000355', 'Mr. SMITH': None},
+            named_entity_counts={'PERSON': {'Jane Doe': 1}},
+            noun_chunks_counts={'health care': 2},
+        )
+        bulk_upload_speaker_word_counts([crec])
+        self.assertEqual(
+            ['M000355'],
+            list(SpeakerWordCounts.objects.values_list('bioguide_id', flat=True)),
+        )
+        self.assertEqual(
+            {'M000355'},
+            set(SpeakerTermCount.objects.values_list('bioguide_id', flat=True)),
+        )
+
+
+class FetchContentTestCase(TestCase):
+
+    def setUp(self):
+        self.s3_client = mock.Mock()
+        self.crec = CRECParser(
+            load_fixture_constituents('parser/test_resources/mods.xml')[0],
+            datetime(2017, 1, 20),
+            s3_client=self.s3_client,
+        )
+
+    def client_error(self, code, status):
+        return botocore.exceptions.ClientError(
+            {
+                'Error': {'Code': code, 'Message': code},
+                'ResponseMetadata': {'HTTPStatusCode': status},
+            },
+            'GetObject',
+        )
+
+    def fetch(self, *side_effect):
+        self.s3_client.get_object.side_effect = side_effect
+        with mock.patch('parser.crec_parser.time.sleep') as sleep:
+            content = self.crec.fetch_content()
+        return content, sleep
+
+    def test_retries_transient_errors(self):
+        body = mock.Mock()
+        body.read.return_value = b'content'
+        content, sleep = self.fetch(
+            self.client_error('SlowDown', 503),
+            self.client_error('InternalError', 500),
+            botocore.exceptions.EndpointConnectionError(endpoint_url='s3'),
+            {'Body': body},
+        )
+        self.assertEqual('content', content)
+        self.assertEqual(
+            [mock.call(1), mock.call(2), mock.call(4)], sleep.call_args_list
+        )
+
+    def test_gives_up_without_sleeping_after_last_attempt(self):
+        content, sleep = self.fetch(
+            *[self.client_error('SlowDown', 503)] * (S3_FETCH_MAX_RETRIES + 1)
+        )
+        self.assertIsNone(content)
+        self.assertEqual(
+            S3_FETCH_MAX_RETRIES + 1, self.s3_client.get_object.call_count
+        )
+        self.assertEqual(S3_FETCH_MAX_RETRIES, sleep.call_count)
+
+    def test_does_not_retry_other_errors(self):
+        for error in (self.client_error('AccessDenied', 403),
+                      self.client_error('NoSuchKey', 404)):
+            self.s3_client.reset_mock()
+            content, sleep = self.fetch(error)
+            self.assertIsNone(content)
+            self.assertEqual(1, self.s3_client.get_object.call_count)
+            sleep.assert_not_called()
+
+
 @mock_s3
 @override_settings(
     CREC_STAGING_S3_BUCKET='my-test-bukkit',
@@ -122,6 +394,30 @@ class CRECParserTestCase(TestCase):
         for c in self.crecs:
             if c.segments:
                 self.assertTrue(len(c.segments[0]) > 0)
+
+    def test_to_es_doc_id(self):
+        for c in self.crecs:
+            doc = c.to_es_doc()
+            self.assertEqual(c.id, doc.meta.id)
+            self.assertEqual(c.id, doc.to_dict(include_meta=True)['_id'])
+
+    def test_segments_match_reference(self):
+        for c in self.crecs:
+            self.assertEqual(segments_reference(c), c.segments)
+
+    def test_speaker_matcher_matches_reference(self):
+        for c in self.crecs:
+            speakers = list(chain(c.speaker_ids.keys(), GENERIC_SPEAKERS))
+            matcher = SpeakerMatcher(speakers)
+            # Split roughly on sentence ends, so every fixture sentence is
+            # checked even without spaCy's sentence boundaries.
+            for sent in re.split(r'(?<=[.!?])\s+', c.content):
+                speaker = matcher.exact_match(sent)
+                if speaker is None:
+                    speaker, _ = matcher.approximate_match(sent)
+                self.assertEqual(
+                    match_speaker_reference(sent, speakers), speaker, sent
+                )
             
     def test_upload_speaker_word_counts(self):
         for c in self.crecs:
@@ -130,3 +426,97 @@ class CRECParserTestCase(TestCase):
         crec_ids = {c.id for c in self.crecs}
         for sw_count in sw_counts:
             self.assertTrue(sw_count.crec_id in crec_ids)
+
+    def test_bulk_upload_speaker_word_counts(self):
+        bulk_upload_speaker_word_counts(self.crecs, batch_size=2)
+        expected = {
+            (bioguide_id, c.id)
+            for c in self.crecs for bioguide_id in c.speaker_ids.values()
+        }
+        self.assertTrue(len(expected) > 0)
+        sw_counts = SpeakerWordCounts.objects.all()
+        self.assertEquals(
+            expected, {(s.bioguide_id, s.crec_id) for s in sw_counts}
+        )
+        # Re-parsing replaces the existing entries.
+        bulk_upload_speaker_word_counts(self.crecs, batch_size=2)
+        self.assertEquals(len(expected), SpeakerWordCounts.objects.count())
+
+    def test_upload_daily_term_counts(self):
+        date = self.crecs[0].date_issued
+        upload_daily_term_counts(date, [])
+        upload_daily_term_counts(date, self.crecs)
+        expected = count_terms(' '.join(c.content for c in self.crecs))
+        counts = DailyTermCount.objects.filter(date=date)
+        self.assertTrue(len(counts) > 0)
+        for term_count in counts:
+            self.assertEquals(expected[term_count.term], term_count.count)
+        self.assertEquals(1, DailyTermCountCoverage.objects.filter(date=date).count())
+
+    def test_metadata_matches_reference(self):
+        for element in load_fixture_constituents(self.xml_path):
+            expected = extract_metadata_reference(element)
+            self.assertEqual(expected, extract_metadata_fields(element))
+            crec = CRECParser(element, None, s3_client=object())
+            for field in METADATA_FIELDS:
+                self.assertEqual(expected[field], getattr(crec, field))
+
+    def test_iter_crecs_from_mods(self):
+        with open(self.xml_path, 'rb') as f:
+            crecs = list(iter_crecs_from_mods(f))
+        self.assertEquals(len(self.crecs), len(crecs))
+        for expected, crec in zip(self.crecs, crecs):
+            self.assertIsNone(crec._xml_tree)
+            self.assertEquals(expected.date_issued, crec.date_issued)
+            for field in METADATA_FIELDS:
+                self.assertEquals(getattr(expected, field), getattr(crec, field))
+
+    def test_process_crecs(self):
+        with open(self.xml_path) as f:
+            crecs = extract_crecs_from_mods(f)
+        processed = process_crecs(crecs, batch_size=4)
+        self.assertTrue(len(processed) > 0)
+        for c in processed:
+            self.assertFalse(c.is_skippable())
+            self.assertIn('textacy_text', c.__dict__)
+        unbatched = {c.id: c for c in self.crecs}
+        for c in processed:
+            self.assertEqual(
+                c.textacy_text.text, unbatched[c.id].textacy_text.text
+            )
+            self.assertEqual(c.segments, unbatched[c.id].segments)
+
+    def test_process_crecs_parse_cache(self):
+        with open(self.xml_path) as f:
+            crecs = extract_crecs_from_mods(f)
+        processed = process_crecs(crecs)
+        self.assertEqual(len(processed), ParseCacheEntry.objects.count())
+        with open(self.xml_path) as f:
+            crecs = extract_crecs_from_mods(f)
+        cached = process_crecs(crecs)
+        self.assertEqual(len(processed), len(cached))
+        for expected, c in zip(processed, cached):
+            self.assertNotIn('textacy_text', c.__dict__)
+            self.assertEqual(expected.named_entity_counts, c.named_entity_counts)
+            self.assertEqual(expected.noun_chunks_counts, c.noun_chunks_counts)
+            self.assertEqual(expected.segments, c.segments)
+        with open(self.xml_path) as f:
+            crecs = extract_crecs_from_mods(f)
+        timer = StageTimer()
+        for c in process_crecs(crecs, use_parse_cache=False, timer=timer):
+            self.assertIn('textacy_text', c.__dict__)
+        self.assertEqual(
+            len(processed), timer.summary()['stages']['spacy']['count']
+        )
+
+    def test_prefetch_content(self):
+        with open(self.xml_path) as f:
+            crecs = extract_crecs_from_mods(f)
+        prefetch_content(crecs, max_workers=4)
+        unbatched = {c.id: c for c in self.crecs}
+        for c in crecs:
+            if c.is_skippable():
+                self.assertNotIn('content', c.__dict__)
+            else:
+                self.assertIn('content', c.__dict__)
+                self.assertEqual(c.content, unbatched[c.id].content)
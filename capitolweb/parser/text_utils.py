@@ -29,6 +29,33 @@ NOUN_CHUNK_LEMMA_BLACKLIST = ['-PRON-']
 
 CHAR_COUNT_THRESHOLD = 4
 
+# Module level compiled patterns for ``preprocess``. Repeats are written with a
+# literal prefix (e.g. "\n\n+" rather than "\n{2,}") so the regex engine can
+# scan ahead for candidate matches instead of attempting one at every position.
+
+HEADER_PATTERN = re.compile('[A-Z!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~ ]{10,}')
+
+EXTENSION_OF_REMARKS_PATTERN = re.compile(
+    'E\s?X\s?T\s?E\s?N\s?S\s?I\s?O\s?N\s+O\s?F\s+R\s?E\s?M\s?A\s?R\s?K\s?S\n+'
+)
+
+PARAGRAPH_BREAK_PATTERN = re.compile('\n\n+')
+
+HORIZONTAL_RULE_PATTERN = re.compile('___+')
+
+HTML_TAG_PATTERN = re.compile('<[^<]+?>')
+
+NEWLINE_RUN_PATTERN = re.compile('\n\n\n+')
+
+WHITESPACE_RUN_PATTERN = re.compile('\s\s+')
+
+PERIOD_RUN_PATTERN = re.compile('\.\.+')
+
+PERIOD_SPACE_RUN_PATTERN = re.compile('[. ][. ]+')
+
+SPURIOUS_PERIOD_PATTERN = re.compile('\\. (?=of|in)')
+
+
 def preprocess(text):
     """
     Preprocess crec text file to filter out html tags and suprfluous parts!
@@ -39,23 +66,22 @@ def preprocess(text):
     Returns:
         str
     """
-    pattern = re.compile('[A-Z!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~ ]{10,}')
-    index = re.search(pattern, text).start()
+    index = HEADER_PATTERN.search(text).start()
     text = text[index:]
-    text = re.sub('E\s?X\s?T\s?E\s?N\s?S\s?I\s?O\s?N\s+O\s?F\s+R\s?E\s?M\s?A\s?R\s?K\s?S\n+', '', text)
-    text = re.sub('HON\.', 'HON', text)
-    text = re.sub('\n{2,}', '. ', text)
-    text = re.sub('_{3,}', '\n', text)
-    text = re.sub('<[^<]+?>', '', text)
-    text = re.sub('\n{3,}', '. ', text).strip()
-    text = re.sub('\n', ' ', text).strip()
-    text = re.sub(' {3,}', ' ', text).strip()
-    text = re.sub('\s{2,}', ' ', text).strip()
-    text = re.sub('\.{2,}', '.', text).strip()
-    text = re.sub('[\. \. ]{2,}', '. ', text).strip()
-    text = re.sub('[\. \.]{2,}', '. ', text).strip()
-    text = re.sub('\. of', ' of', text)
-    text = re.sub('\. in', ' in', text)
+    text = EXTENSION_OF_REMARKS_PATTERN.sub('', text)
+    text = text.replace('HON.', 'HON')
+    text = PARAGRAPH_BREAK_PATTERN.sub('. ', text)
+    text = HORIZONTAL_RULE_PATTERN.sub('\n', text)
+    text = HTML_TAG_PATTERN.sub('', text)
+    text = NEWLINE_RUN_PATTERN.sub('. ', text).strip()
+    # Collapsing whitespace runs also covers runs of 3 or more spaces.
+    text = text.replace('\n', ' ')
+    text = WHITESPACE_RUN_PATTERN.sub(' ', text).strip()
+    text = PERIOD_RUN_PATTERN.sub('.', text)
+    # One pass suffices, each run becomes ". " which can't merge with the
+    # runs around it.
+    text = PERIOD_SPACE_RUN_PATTERN.sub('. ', text).strip()
+    text = SPURIOUS_PERIOD_PATTERN.sub(' ', text)
     return text
 
 def remove_trailing_tokens(entity, verb=True, adposition=True, conjunction=True, determiner=True,
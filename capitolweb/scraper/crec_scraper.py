@@ -4,11 +4,19 @@ retrieved from gpo.gov .
 
 import os
 import io
+import json
+import hashlib
+import time
 import logging
+import threading
 from zipfile import ZipFile
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 import requests
+from requests.adapters import HTTPAdapter
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from django.conf import settings
 
@@ -18,6 +26,24 @@ from scraper.models import CRECScraperResult
 logger = logging.getLogger(__name__)
 
 
+DEFAULT_UPLOAD_WORKERS = 16
+
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+DOWNLOAD_MAX_RETRIES = 3
+
+
+MANIFEST_FILENAME = 'manifest.json'
+
+
+DEFAULT_HTTP_POOL_SIZE = 4
+
+
+DEFAULT_MIN_REQUEST_INTERVAL = 1.0
+
+
 def crec_s3_key(filename, date_issued):
     """Location of a CREC document (or mods.xml file) within an S3 bucket.
     
@@ -47,6 +73,43 @@ class CRECDataNotFoundException(Exception):
         self.url = url
 
 
+class CRECDownloadIncompleteException(Exception):
+    """Indicates a streamed download ended before the expected number of bytes
+    were received."""
+    
+    def __init__(self, url, expected_size, actual_size):
+        self.url = url
+        self.expected_size = expected_size
+        self.actual_size = actual_size
+        super(CRECDownloadIncompleteException, self).__init__(
+            'Downloaded {0} of {1} bytes from "{2}"'.format(
+                actual_size, expected_size, url
+            )
+        )
+
+
+class RateLimiter(object):
+    """Spaces out calls to ``wait`` made from any number of threads so that
+    they return at least ``min_interval`` seconds apart.
+
+    Args:
+        min_interval (:obj:`float`): Minimum number of seconds between calls.
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_time = 0
+
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+
 class CRECScraper(object):
     """Downloads the zip for specified date from gpo.gov and uploads all html
     and mods.xml files to s3.
@@ -54,6 +117,14 @@ class CRECScraper(object):
     Args:
         s3_bucket (:obj:`str`): The name of an S3 bucket to stage unpacked html
             files in.
+        upload_workers (:obj:`int`): Number of files uploaded to s3
+            concurrently.
+        stream_to_disk (:obj:`bool`): If true, zips are streamed to a file in
+            ``CREC_STAGING_FOLDER`` rather than held in memory.
+        http_pool_size (:obj:`int`): Number of pooled connections to gpo.gov,
+            shared by all threads using this scraper.
+        min_request_interval (:obj:`float`): Minimum number of seconds between
+            requests to gpo.gov, across all threads.
 
     Attributes:
         CREC_ZIP_TEMPLATE (:obj:`str`): The endpoint template for a CREC zip.
@@ -61,9 +132,27 @@ class CRECScraper(object):
 
     CREC_ZIP_URL_TEMPLATE = 'https://www.gpo.gov/fdsys/pkg/CREC-%Y-%m-%d.zip'
 
-    def __init__(self, s3_bucket=settings.CREC_STAGING_S3_BUCKET):
+    def __init__(self,
+                 s3_bucket=settings.CREC_STAGING_S3_BUCKET,
+                 upload_workers=DEFAULT_UPLOAD_WORKERS,
+                 stream_to_disk=False,
+                 http_pool_size=DEFAULT_HTTP_POOL_SIZE,
+                 min_request_interval=DEFAULT_MIN_REQUEST_INTERVAL):
         self.s3_bucket = s3_bucket
-        self.s3 = boto3.resource('s3')
+        self.stream_to_disk = stream_to_disk
+        self.session = requests.Session()
+        self.session.mount(
+            'https://',
+            HTTPAdapter(pool_connections=1, pool_maxsize=http_pool_size),
+        )
+        self.rate_limiter = RateLimiter(min_request_interval)
+        self.upload_workers = upload_workers
+        self.s3 = boto3.resource(
+            's3', config=Config(max_pool_connections=upload_workers)
+        )
+        # CREC files are small, concurrency comes from uploading many files at
+        # once rather than from splitting each one into parts.
+        self.transfer_config = TransferConfig(max_concurrency=1)
 
     def download_crec_zip(self, url):
         """Retrieves the CREC zip for this date from gpo.gov.
@@ -79,7 +168,8 @@ class CRECScraper(object):
         Returns:
             :class:`zipfile.ZipFile`: An in-memory ZipFile object.
         """
-        response = requests.get(url)
+        self.rate_limiter.wait()
+        response = self.session.get(url)
         if response.status_code == 404:
             raise CRECDataNotFoundException(url)
         if response.status_code != 200:
@@ -87,33 +177,222 @@ class CRECScraper(object):
         zf = ZipFile(io.BytesIO(response.content))
         return zf
     
+    def download_crec_zip_to_disk(self, url, file_path):
+        """Streams the CREC zip at the given url to disk in chunks, so memory
+        use stays flat regardless of archive size. Partial downloads are kept
+        in a ".part" file next to ``file_path`` and resumed with an HTTP range
+        request, both on retry and on the next run.
+
+        Args:
+            url (str): A gpo.gov URL to a CREC zip file.
+            file_path (str): Where to write the zip file.
+
+        Raises:
+            CRECDataNotFoundException: Indicates a 404 from gpo.gov.
+            CRECDownloadIncompleteException: The download could not be
+                completed after retrying.
+
+        Returns:
+            :class:`zipfile.ZipFile`: A ZipFile object reading from disk.
+        """
+        part_path = file_path + '.part'
+        for attempt in range(DOWNLOAD_MAX_RETRIES + 1):
+            try:
+                self._stream_to_file(url, part_path)
+                break
+            except (requests.exceptions.RequestException,
+                    CRECDownloadIncompleteException) as e:
+                if attempt == DOWNLOAD_MAX_RETRIES:
+                    raise
+                logger.warning(
+                    'Interrupted downloading "{0}", resuming: {1}'.format(url, e)
+                )
+        os.rename(part_path, file_path)
+        return ZipFile(file_path)
+
+    def _stream_to_file(self, url, part_path):
+        offset = 0
+        if os.path.exists(part_path):
+            offset = os.path.getsize(part_path)
+        headers = {}
+        if offset:
+            headers['Range'] = 'bytes={0}-'.format(offset)
+        self.rate_limiter.wait()
+        response = self.session.get(url, headers=headers, stream=True)
+        try:
+            if response.status_code == 404:
+                raise CRECDataNotFoundException(url)
+            if response.status_code == 416:
+                # The partial file is no longer valid for this resource.
+                os.remove(part_path)
+                return self._stream_to_file(url, part_path)
+            if response.status_code == 206:
+                mode = 'ab'
+                content_range = response.headers.get('Content-Range', '')
+                total = content_range.rpartition('/')[2]
+                expected_size = int(total) if total.isdigit() else None
+            elif response.status_code == 200:
+                # Server ignored the range request, start over.
+                mode = 'wb'
+                content_length = response.headers.get('Content-Length')
+                expected_size = int(content_length) if content_length else None
+            else:
+                raise Exception(
+                    'Non-200 response code from gpo.gov for url "{0}"'.format(url)
+                )
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+        finally:
+            response.close()
+        actual_size = os.path.getsize(part_path)
+        if expected_size is not None and actual_size != expected_size:
+            raise CRECDownloadIncompleteException(url, expected_size, actual_size)
+
     def is_relevant_filename(self, file_name):
         return file_name.endswith('htm') or file_name.endswith('mods.xml')
     
-    def extract_and_upload_to_s3(self, crec_zip_file, date):
-        """Uploads the file at the provided path to s3. See ``crec_scraper.crec_s3_key``
-        for s3 key format.
+    def load_manifest(self, date):
+        """Retrieves the manifest of files staged for the given date, mapping
+        each filename to the md5 hex digest of its contents.
+
+        Args:
+            date (:class:`datetime.datetime`): Date to load the manifest for.
+
+        Returns:
+            dict: The manifest, empty if none has been written yet.
+        """
+        obj = self.s3.Object(
+            self.s3_bucket, crec_s3_key(MANIFEST_FILENAME, date)
+        )
+        try:
+            return json.loads(obj.get()['Body'].read().decode('utf-8'))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return {}
+            raise
+
+    def save_manifest(self, date, manifest):
+        """Writes the manifest of files staged for the given date to s3.
+
+        Args:
+            date (:class:`datetime.datetime`): Date to write the manifest for.
+            manifest (dict): Maps filename to md5 hex digest.
+        """
+        obj = self.s3.Object(
+            self.s3_bucket, crec_s3_key(MANIFEST_FILENAME, date)
+        )
+        obj.put(Body=json.dumps(manifest, sort_keys=True).encode('utf-8'))
+
+    def is_staged(self, s3_key, md5):
+        """Checks whether the object at the given key already has the given
+        contents by comparing its ETag, which is the md5 of the contents for
+        objects uploaded in a single part.
+
+        Args:
+            s3_key (str): The key to check.
+            md5 (str): The md5 hex digest of the contents to upload.
+
+        Returns:
+            bool: True if the object exists with identical contents.
+        """
+        try:
+            response = self.s3.meta.client.head_object(
+                Bucket=self.s3_bucket, Key=s3_key
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return False
+            raise
+        return response.get('ETag', '').strip('"') == md5
+
+    def upload_to_s3(self, data, s3_key):
+        """Uploads the contents of a single file to s3 using the client shared
+        by all upload threads.
+
+        Args:
+            data (bytes): The file contents.
+            s3_key (str): The key to upload to.
+        """
+        self.s3.meta.client.upload_fileobj(
+            io.BytesIO(data), self.s3_bucket, s3_key, Config=self.transfer_config
+        )
+
+    def upload_if_changed(self, data, s3_key, md5, staged_md5):
+        """Uploads the file unless the manifest or, failing that, the existing
+        object's ETag shows that identical contents are already staged.
+
+        Returns:
+            bool: True if the file was uploaded.
+        """
+        if staged_md5 == md5:
+            return False
+        if staged_md5 is None and self.is_staged(s3_key, md5):
+            return False
+        self.upload_to_s3(data, s3_key)
+        return True
+
+    def extract_and_upload_to_s3(self, crec_zip_file, date, force=False):
+        """Uploads the html and mods.xml files in the zip to s3. See
+        ``crec_scraper.crec_s3_key`` for s3 key format.
+
+        Members are read from the archive sequentially in the calling thread
+        and handed to a bounded pool of upload threads, so the archive is never
+        read concurrently and at most a few files per thread are held in
+        memory at once.
+
+        Files whose contents are unchanged since they were last staged (per
+        the date's manifest of md5 hashes, or the object's ETag if it predates
+        the manifest) are skipped, and the manifest is updated afterwards.
     
         Args:
-            file_path (str): Path to html file.
+            crec_zip_file (:class:`zipfile.ZipFile`): The CREC zip for a day.
             date (:class:`datetime.datetime`): Date to upload data for.
+            force (bool): If true, upload every file regardless of what has
+                already been staged.
         
         Returns:
-            str: The S3 key the file was uploaded to.
+            list of str: The S3 keys the files were staged at.
         """
+        manifest = {} if force else self.load_manifest(date)
+        new_manifest = {}
         s3_keys = []
-        for zipped_file in crec_zip_file.filelist:
-            if self.is_relevant_filename(zipped_file.filename):
-                s3_key = crec_s3_key(os.path.basename(zipped_file.filename), date)
+        futures = []
+        in_flight = threading.BoundedSemaphore(2 * self.upload_workers)
+        with ThreadPoolExecutor(max_workers=self.upload_workers) as executor:
+            for zipped_file in crec_zip_file.filelist:
+                if not self.is_relevant_filename(zipped_file.filename):
+                    continue
+                filename = os.path.basename(zipped_file.filename)
+                s3_key = crec_s3_key(filename, date)
                 s3_keys.append(s3_key)
+                data = crec_zip_file.read(zipped_file)
+                md5 = hashlib.md5(data).hexdigest()
+                new_manifest[filename] = md5
+                if force:
+                    staged_md5 = ''
+                else:
+                    staged_md5 = manifest.get(filename)
                 logger.debug(
-                    'Uploading "{0}" to "s3://{1}/{2}".'.format(
+                    'Staging "{0}" at "s3://{1}/{2}".'.format(
                         zipped_file.filename, self.s3_bucket, s3_key
                     )
                 )
-                with crec_zip_file.open(zipped_file) as unzipped_file:
-                    obj = self.s3.Object(self.s3_bucket, s3_key)
-                    obj.upload_fileobj(unzipped_file)
+                in_flight.acquire()
+                future = executor.submit(
+                    self.upload_if_changed, data, s3_key, md5, staged_md5
+                )
+                future.add_done_callback(lambda f: in_flight.release())
+                futures.append(future)
+        # Re-raises the first upload error, if any.
+        num_uploaded = sum(future.result() for future in futures)
+        logger.info(
+            'Uploaded {0} files, {1} unchanged files skipped.'.format(
+                num_uploaded, len(s3_keys) - num_uploaded
+            )
+        )
+        if new_manifest != manifest:
+            self.save_manifest(date, new_manifest)
         return s3_keys
 
     def get_crec_zip_url(self, date):
@@ -128,18 +407,32 @@ class CRECScraper(object):
         """
         return date.strftime(self.CREC_ZIP_URL_TEMPLATE)
 
-    def scrape_files_for_date(self, date):
+    def scrape_files_for_date(self, date, force=False):
         """Retrieve the zip file for the given date, unpack all CREC files and
         the mods.xml metadata file to memory, then upload to s3. Stores results
         in an ORM, ``scraper.models.CRECScraperResult``.
+
+        Dates that have already been scraped successfully are skipped, and
+        files that are already staged with identical contents are not
+        re-uploaded.
         
         Args:
             date (:class:`datetime.datetime`): The date to retreive docs for.
+            force (bool): If true, scrape and upload everything even if the
+                date has already been scraped.
         
         Returns:
             :class:`scraper.models.CRECScraperResult`: An ORM model instance
                 containing a summary of the scraper job results.
         """
+        if not force:
+            # Dates without data (e.g. not yet published) are retried.
+            previous_result = CRECScraperResult.objects.filter(
+                date=date, success=True, num_crec_files_uploaded__gt=0
+            ).last()
+            if previous_result is not None:
+                logger.info('Data for {0} already scraped, skipping.'.format(date))
+                return previous_result
         logger.info('Scraping data for {0}...'.format(date))
         orm_result = CRECScraperResult.objects.create(
             date=date,
@@ -147,9 +440,15 @@ class CRECScraper(object):
             success=False,
             num_crec_files_uploaded=0
         )
-        url = date.strftime(self.CREC_ZIP_URL_TEMPLATE)
+        url = self.get_crec_zip_url(date)
+        zip_path = os.path.join(
+            settings.CREC_STAGING_FOLDER, os.path.basename(url)
+        )
         try:
-            crec_zip = self.download_crec_zip(self.get_crec_zip_url(date))
+            if self.stream_to_disk:
+                crec_zip = self.download_crec_zip_to_disk(url, zip_path)
+            else:
+                crec_zip = self.download_crec_zip(url)
         except CRECDataNotFoundException as e:
             logger.info('No data found for date {0} at url "{1}"'.format(date, url))
             orm_result.success = True
@@ -162,12 +461,16 @@ class CRECScraper(object):
             return orm_result
         logger.info('Uploading extracted data to s3...')
         try:
-            s3_keys = self.extract_and_upload_to_s3(crec_zip, date)
+            s3_keys = self.extract_and_upload_to_s3(crec_zip, date, force=force)
         except ClientError as e:
             orm_result.message = 'Error uploading CREC data to s3, exiting'
             logger.exception(orm_result.message)
             orm_result.save()
             return orm_result
+        finally:
+            crec_zip.close()
+            if self.stream_to_disk:
+                os.remove(zip_path)
         logger.info('Uploads finished.')
         orm_result.message = '\n'.join(s3_keys)
         orm_result.num_crec_files_uploaded = len(
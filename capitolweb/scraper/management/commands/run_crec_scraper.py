@@ -1,12 +1,19 @@
 import logging
 from datetime import datetime
 from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
 
+from django import db
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from scraper.models import CRECScraperResult
 from scraper.crec_scraper import CRECScraper
+from scraper.crec_scraper import DEFAULT_UPLOAD_WORKERS
+from scraper.crec_scraper import DEFAULT_MIN_REQUEST_INTERVAL
+
+
+logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
@@ -34,6 +41,38 @@ class Command(BaseCommand):
             help='Location of crec data.',
             default=settings.CREC_STAGING_S3_BUCKET
         )
+        parser.add_argument(
+            '--force',
+            help='Re-scrape dates that have already been scraped and re-upload '
+                 'unchanged files.',
+            action='store_true',
+            default=False,
+        )
+        parser.add_argument(
+            '--stream_to_disk',
+            help='Stream zips to CREC_STAGING_FOLDER instead of holding them '
+                 'in memory.',
+            action='store_true',
+            default=False,
+        )
+        parser.add_argument(
+            '--upload_workers',
+            help='Number of files to upload to s3 concurrently.',
+            type=int,
+            default=DEFAULT_UPLOAD_WORKERS,
+        )
+        parser.add_argument(
+            '--concurrency',
+            help='Number of dates to scrape concurrently.',
+            type=int,
+            default=1,
+        )
+        parser.add_argument(
+            '--min_request_interval',
+            help='Minimum number of seconds between requests to gpo.gov.',
+            type=float,
+            default=DEFAULT_MIN_REQUEST_INTERVAL,
+        )
 
     def handle(self, *args, **options):
         start_date = options['start_date']
@@ -43,7 +82,64 @@ class Command(BaseCommand):
             end_date = options['end_date']
         start_date.replace(hour=0, minute=0, second=0, microsecond=0)
         end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        scraper = CRECScraper(options['s3_bucket'])
+        scraper = CRECScraper(
+            options['s3_bucket'],
+            upload_workers=options['upload_workers'],
+            stream_to_disk=options['stream_to_disk'],
+            http_pool_size=options['concurrency'],
+            min_request_interval=options['min_request_interval'],
+        )
+        dates = []
         while start_date < end_date:
-            result = scraper.scrape_files_for_date(start_date)
+            dates.append(start_date)
             start_date += timedelta(days=1)
+
+        errors = []
+
+        def scrape(date):
+            try:
+                return scraper.scrape_files_for_date(date, force=options['force'])
+            except Exception:
+                # Unexpected errors (e.g. sqlite's "database is locked" when
+                # dates are scraped concurrently) fail this date only.
+                message = 'Error scraping CREC data for date {0}.'.format(
+                    date.strftime('%Y-%m-%d')
+                )
+                logger.exception(message)
+                result = CRECScraperResult(
+                    date=date,
+                    success=False,
+                    message=message,
+                    num_crec_files_uploaded=0,
+                )
+                errors.append(result)
+                return result
+            finally:
+                if options['concurrency'] > 1:
+                    # Each thread has its own db connection.
+                    db.connection.close()
+
+        if options['concurrency'] > 1:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                results = list(executor.map(scrape, dates))
+        else:
+            results = [scrape(date) for date in dates]
+        # Failures are recorded once the workers are done, so they do not
+        # contend for the db.
+        for result in errors:
+            result.save()
+        self.report(results)
+
+    def report(self, results):
+        failed = [r for r in results if not r.success]
+        self.stdout.write(
+            'Scraped {0} dates: {1} succeeded, {2} failed, {3} CREC files '
+            'staged.'.format(
+                len(results),
+                len(results) - len(failed),
+                len(failed),
+                sum(r.num_crec_files_uploaded for r in results),
+            )
+        )
+        for result in failed:
+            self.stdout.write(str(result))
@@ -1,16 +1,72 @@
 import os
+import shutil
+import time
+import tempfile
+import threading
 from datetime import datetime
+from io import StringIO
+from unittest import mock
 
 import requests_mock
 import requests
 import boto3
 from lxml import etree
 from moto import mock_s3
+from django.core.management import call_command
+from django.db import OperationalError
 from django.test import TestCase
 from django.test import override_settings
 from django.conf import settings
 
 from scraper.crec_scraper import CRECScraper
+from scraper.crec_scraper import RateLimiter
+from scraper.models import CRECScraperResult
+
+
+class RateLimiterTestCase(TestCase):
+
+    def test_wait_spaces_calls_across_threads(self):
+        rate_limiter = RateLimiter(0.05)
+        times = []
+        def call():
+            rate_limiter.wait()
+            times.append(time.time())
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        times.sort()
+        for earlier, later in zip(times, times[1:]):
+            self.assertTrue(later - earlier >= 0.04)
+
+
+class RunCRECScraperTestCase(TestCase):
+
+    def test_concurrent_dates(self):
+        def scrape_files_for_date(scraper, date, force=False):
+            if date.day == 2:
+                raise OperationalError('database is locked')
+            return CRECScraperResult(
+                date=date, success=True, message='', num_crec_files_uploaded=3,
+            )
+        out = StringIO()
+        with mock.patch.object(
+                CRECScraper, 'scrape_files_for_date', autospec=True,
+                side_effect=scrape_files_for_date) as scrape:
+            call_command(
+                'run_crec_scraper', start_date=datetime(2017, 1, 1),
+                end_date=datetime(2017, 1, 5), concurrency=3, stdout=out,
+            )
+        self.assertEqual(4, scrape.call_count)
+        self.assertIn(
+            'Scraped 4 dates: 3 succeeded, 1 failed, 9 CREC files staged.',
+            out.getvalue(),
+        )
+        failed = CRECScraperResult.objects.get()
+        self.assertFalse(failed.success)
+        self.assertEqual(datetime(2017, 1, 2).date(), failed.date)
+
 
 @mock_s3
 @requests_mock.Mocker()
@@ -54,6 +110,46 @@ class CRECScraperTestCase(TestCase):
             doc = etree.parse(f)
             self.assertTrue(doc.getroot().get('ID'))
     
+    def test_download_crec_zip_to_disk(self, requests_mocker):
+        requests_mocker.register_uri(
+            'GET',
+            'https://www.gpo.gov/fdsys/pkg/CREC-2017-01-20.zip',
+            content=self.test_zip_data
+        )
+        staging_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, staging_folder)
+        zip_path = os.path.join(staging_folder, 'CREC-2017-01-20.zip')
+        crec_url = self.crec_scraper.get_crec_zip_url(self.test_date)
+        crec_zip = self.crec_scraper.download_crec_zip_to_disk(crec_url, zip_path)
+        self.assertEquals(len(self.test_zip_data), os.path.getsize(zip_path))
+        self.assertFalse(os.path.exists(zip_path + '.part'))
+        mods_files = [
+            f for f in crec_zip.filelist
+            if f.filename.endswith('mods.xml')
+        ]
+        self.assertTrue(len(mods_files) == 1)
+
+    def test_download_crec_zip_to_disk_resume(self, requests_mocker):
+        total = len(self.test_zip_data)
+        requests_mocker.register_uri(
+            'GET',
+            'https://www.gpo.gov/fdsys/pkg/CREC-2017-01-20.zip',
+            request_headers={'Range': 'bytes=1000-'},
+            status_code=206,
+            headers={'Content-Range': 'bytes 1000-{0}/{1}'.format(total - 1, total)},
+            content=self.test_zip_data[1000:]
+        )
+        staging_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, staging_folder)
+        zip_path = os.path.join(staging_folder, 'CREC-2017-01-20.zip')
+        with open(zip_path + '.part', 'wb') as f:
+            f.write(self.test_zip_data[:1000])
+        crec_url = self.crec_scraper.get_crec_zip_url(self.test_date)
+        crec_zip = self.crec_scraper.download_crec_zip_to_disk(crec_url, zip_path)
+        with open(zip_path, 'rb') as f:
+            self.assertEquals(self.test_zip_data, f.read())
+        self.assertTrue(len(crec_zip.filelist) > 0)
+
     def test_upload_to_s3(self, requests_mocker):        
         requests_mocker.register_uri(
             'GET',
@@ -76,6 +172,26 @@ class CRECScraperTestCase(TestCase):
                 doc = etree.parse(response['Body'])
                 self.assertTrue(doc.getroot().get('ID'))
     
+    def test_upload_to_s3_sequential(self, requests_mocker):
+        requests_mocker.register_uri(
+            'GET',
+            'https://www.gpo.gov/fdsys/pkg/CREC-2017-01-20.zip',
+            content=self.test_zip_data
+        )
+        crec_scraper = CRECScraper(
+            s3_bucket=settings.CREC_STAGING_S3_BUCKET, upload_workers=1
+        )
+        crec_url = crec_scraper.get_crec_zip_url(self.test_date)
+        zf = crec_scraper.download_crec_zip(crec_url)
+        s3_keys = crec_scraper.extract_and_upload_to_s3(zf, self.test_date)
+        concurrent_s3_keys = self.crec_scraper.extract_and_upload_to_s3(
+            zf, self.test_date
+        )
+        self.assertEquals(s3_keys, concurrent_s3_keys)
+        for s3_key in s3_keys:
+            obj = self.s3.Object(settings.CREC_STAGING_S3_BUCKET, s3_key)
+            self.assertTrue(obj.get()['ContentLength'] > 0)
+
     def test_scrape_files_for_date(self, requests_mocker):
         requests_mocker.register_uri(
             'GET',
@@ -85,3 +201,67 @@ class CRECScraperTestCase(TestCase):
         result = self.crec_scraper.scrape_files_for_date(self.test_date)
         self.assertIsNotNone(result)
         self.assertTrue(result.success)
+
+    def test_scrape_files_for_date_stream_to_disk(self, requests_mocker):
+        requests_mocker.register_uri(
+            'GET',
+            'https://www.gpo.gov/fdsys/pkg/CREC-2017-01-20.zip',
+            content=self.test_zip_data
+        )
+        staging_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, staging_folder)
+        crec_scraper = CRECScraper(
+            s3_bucket=settings.CREC_STAGING_S3_BUCKET, stream_to_disk=True
+        )
+        with self.settings(CREC_STAGING_FOLDER=staging_folder):
+            result = crec_scraper.scrape_files_for_date(self.test_date)
+        self.assertTrue(result.success)
+        self.assertTrue(result.num_crec_files_uploaded > 0)
+        self.assertEquals([], os.listdir(staging_folder))
+
+    def test_upload_to_s3_skips_unchanged_files(self, requests_mocker):
+        requests_mocker.register_uri(
+            'GET',
+            'https://www.gpo.gov/fdsys/pkg/CREC-2017-01-20.zip',
+            content=self.test_zip_data
+        )
+        crec_url = self.crec_scraper.get_crec_zip_url(self.test_date)
+        zf = self.crec_scraper.download_crec_zip(crec_url)
+        s3_keys = self.crec_scraper.extract_and_upload_to_s3(zf, self.test_date)
+        manifest = self.crec_scraper.load_manifest(self.test_date)
+        self.assertEquals(len(s3_keys), len(manifest))
+        with mock.patch.object(self.crec_scraper, 'upload_to_s3') as upload:
+            rerun_s3_keys = self.crec_scraper.extract_and_upload_to_s3(
+                zf, self.test_date
+            )
+            self.assertEquals(s3_keys, rerun_s3_keys)
+            self.assertFalse(upload.called)
+        # Files staged before the manifest existed are checked by ETag.
+        self.s3.Object(
+            settings.CREC_STAGING_S3_BUCKET, 'crec-test/2017/01/20/manifest.json'
+        ).delete()
+        with mock.patch.object(self.crec_scraper, 'upload_to_s3') as upload:
+            self.crec_scraper.extract_and_upload_to_s3(zf, self.test_date)
+            self.assertFalse(upload.called)
+        with mock.patch.object(self.crec_scraper, 'upload_to_s3') as upload:
+            self.crec_scraper.extract_and_upload_to_s3(
+                zf, self.test_date, force=True
+            )
+            self.assertEquals(len(s3_keys), upload.call_count)
+
+    def test_scrape_files_for_date_skips_scraped_dates(self, requests_mocker):
+        requests_mocker.register_uri(
+            'GET',
+            'https://www.gpo.gov/fdsys/pkg/CREC-2017-01-20.zip',
+            content=self.test_zip_data
+        )
+        result = self.crec_scraper.scrape_files_for_date(self.test_date)
+        self.assertTrue(result.success)
+        rerun_result = self.crec_scraper.scrape_files_for_date(self.test_date)
+        self.assertEquals(result.pk, rerun_result.pk)
+        self.assertEquals(1, requests_mocker.call_count)
+        forced_result = self.crec_scraper.scrape_files_for_date(
+            self.test_date, force=True
+        )
+        self.assertNotEqual(result.pk, forced_result.pk)
+        self.assertEquals(2, CRECScraperResult.objects.count())